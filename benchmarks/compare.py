@@ -0,0 +1,49 @@
+"""Сравнение двух файлов результатов ``benchmarks.load`` или ``micro``.
+
+Регрессией считается рост p50/p99 или падение пропускной способности
+больше чем на ``--threshold`` процентов; тогда код возврата 1.
+
+    python -m benchmarks.compare benchmarks/results/load-abc1234.json \\
+        benchmarks/results/load-def5678.json
+"""
+import argparse
+import json
+import sys
+
+# метрика и знак: для времени рост - ухудшение, для пропускной - падение
+METRICS = {'throughput': -1, 'p50': 1, 'p99': 1}
+
+
+def load(path: str) -> dict:
+    with open(path, encoding='utf8') as f:
+        return json.load(f)
+
+
+def compare(base: dict, head: dict, threshold: float) -> bool:
+    print(f'{base["meta"]["commit"]} -> {head["meta"]["commit"]}')
+    print(f'{"name":>22}{"metric":>12}{"base":>12}{"head":>12}{"change":>10}')
+    regressed = False
+    for name, old in base['results'].items():
+        new = head['results'].get(name)
+        if not new or not old['count'] or not new['count']:
+            print(f'{name:>22}  нет данных для сравнения')
+            continue
+        for metric, sign in METRICS.items():
+            change = (new[metric] - old[metric]) / old[metric] * 100
+            worse = change * sign > threshold
+            regressed |= worse
+            print(
+                f'{name:>22}{metric:>12}{old[metric]:>12.3f}'
+                f'{new[metric]:>12.3f}{change:>+9.1f}%'
+                f'{" !" if worse else ""}'
+            )
+    return regressed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('base')
+    parser.add_argument('head')
+    parser.add_argument('--threshold', type=float, default=10)
+    args = parser.parse_args()
+    sys.exit(int(compare(load(args.base), load(args.head), args.threshold)))
@@ -0,0 +1,222 @@
+"""Сравнение планов и задержек запросов к заметкам до и после индексов.
+
+Создаёт отдельную базу (по умолчанию ``<DB_NAME>_bench``), заполняет её
+пользователями, тегами и заметками, затем выполняет запросы, которые
+строит приложение, без индексов миграции 3e008541210f и с ними.
+
+    python -m benchmarks.indexes --notes 1000000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import asyncpg
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from config import DatabaseConfig
+from src.database.base import Base
+from src.database.models import notes_tags_table
+
+INDEXES = (
+    'ix_notes_user_id_created_at_id',
+    'ix_tags_title',
+    'ix_notes_tags_table_association_tags_id_notes_id',
+)
+
+QUERIES = {
+    # Note.get_note_rows: первая страница
+    'notes_first_page': (
+        'SELECT id, title, created_at FROM notes WHERE user_id = $1 '
+        'ORDER BY created_at DESC, id DESC LIMIT 50',
+        lambda s: (s['user_id'],),
+    ),
+    # Note.get_note_rows: страница из середины по курсору
+    'notes_keyset_page': (
+        'SELECT id, title, created_at FROM notes WHERE user_id = $1 '
+        'AND (created_at, id) < ($2, $3) '
+        'ORDER BY created_at DESC, id DESC LIMIT 50',
+        lambda s: (s['user_id'], s['cursor_created_at'], s['cursor_id']),
+    ),
+    # Tag._title_ids: промахи tag_cache в Tag.resolve_ids и get_ids_by_title
+    'tags_by_title': (
+        'SELECT title, id FROM tags WHERE title = ANY($1::varchar[])',
+        lambda s: (s['tag_titles'],),
+    ),
+    # заметки по тегу через обратную сторону таблицы связей
+    'notes_by_tag': (
+        'SELECT notes_id FROM notes_tags_table_association '
+        'WHERE tags_id = $1',
+        lambda s: (s['tag_id'],),
+    ),
+}
+
+
+def compile_ddl(element) -> str:
+    return str(element.compile(dialect=postgresql.dialect()))
+
+
+def index_statements() -> dict[str, str]:
+    return {
+        index.name: compile_ddl(CreateIndex(index))
+        for table in Base.metadata.sorted_tables
+        for index in table.indexes
+    }
+
+
+async def ensure_database(name: str):
+    conn = await asyncpg.connect(
+        host=DatabaseConfig.db_host,
+        port=DatabaseConfig.db_port,
+        user=DatabaseConfig.db_user,
+        password=DatabaseConfig.db_pass,
+        database='postgres',
+    )
+    try:
+        exists = await conn.fetchval(
+            'SELECT 1 FROM pg_database WHERE datname = $1', name
+        )
+        if not exists:
+            await conn.execute(f'CREATE DATABASE "{name}"')
+    finally:
+        await conn.close()
+
+
+async def seed(conn, users: int, notes: int, tags: int, tags_per_note: int):
+    tables = ', '.join(t.name for t in Base.metadata.sorted_tables)
+    await conn.execute(f'DROP TABLE IF EXISTS {tables} CASCADE')
+    for table in Base.metadata.sorted_tables:
+        await conn.execute(compile_ddl(CreateTable(table)))
+
+    started = time.perf_counter()
+    await conn.execute(
+        """
+        INSERT INTO users (username, password, is_active, created_at,
+                           updated_at)
+        SELECT 'user' || g, 'x', true, now(), now()
+        FROM generate_series(1, $1) AS g
+        """,
+        users,
+    )
+    await conn.execute(
+        """
+        INSERT INTO tags (title, created_at, updated_at)
+        SELECT 'tag' || g, now(), now() FROM generate_series(1, $1) AS g
+        """,
+        tags,
+    )
+    await conn.execute(
+        """
+        INSERT INTO notes (title, text, user_id, created_at, updated_at)
+        SELECT 'note ' || g, repeat(md5(g::text), 8), 1 + g % $2,
+               now() - (g % 100000) * interval '1 minute', now()
+        FROM generate_series(1, $1) AS g
+        """,
+        notes,
+        users,
+    )
+    await conn.execute(
+        f"""
+        INSERT INTO {notes_tags_table.name} (notes_id, tags_id)
+        SELECT DISTINCT n.id, 1 + (n.id * 7919 + k * 104729) % $1
+        FROM notes AS n, generate_series(1, $2) AS k
+        """,
+        tags,
+        tags_per_note,
+    )
+    print(f'seed: {time.perf_counter() - started:.1f}s')
+
+
+async def sample_params(conn):
+    user_id, count = await conn.fetchrow(
+        'SELECT user_id, count(*) FROM notes GROUP BY user_id '
+        'ORDER BY count(*) DESC LIMIT 1'
+    )
+    cursor = await conn.fetchrow(
+        'SELECT created_at, id FROM notes WHERE user_id = $1 '
+        'ORDER BY created_at DESC, id DESC OFFSET $2 LIMIT 1',
+        user_id,
+        count // 2,
+    )
+    return {
+        'user_id': user_id,
+        'cursor_created_at': cursor['created_at'],
+        'cursor_id': cursor['id'],
+        'tag_titles': [f'tag{i}' for i in range(1, 21)],
+        'tag_id': await conn.fetchval('SELECT min(id) FROM tags'),
+    }
+
+
+async def measure(conn, params: dict, repeat: int):
+    results = {}
+    for name, (query, args) in QUERIES.items():
+        values = args(params)
+        plan = await conn.fetch(f'EXPLAIN (ANALYZE, BUFFERS) {query}', *values)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await conn.fetch(query, *values)
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = {
+            'plan': '\n'.join(row[0] for row in plan),
+            'median_ms': statistics.median(timings),
+        }
+    return results
+
+
+async def main(args):
+    database = args.database or f'{DatabaseConfig.db_name}_bench'
+    await ensure_database(database)
+    conn = await asyncpg.connect(
+        host=DatabaseConfig.db_host,
+        port=DatabaseConfig.db_port,
+        user=DatabaseConfig.db_user,
+        password=DatabaseConfig.db_pass,
+        database=database,
+    )
+    try:
+        if not args.skip_seed:
+            await seed(
+                conn, args.users, args.notes, args.tags, args.tags_per_note
+            )
+
+        index_ddl = index_statements()
+        for name in INDEXES:
+            await conn.execute(f'DROP INDEX IF EXISTS {name}')
+        await conn.execute('ANALYZE')
+        params = await sample_params(conn)
+        before = await measure(conn, params, args.repeat)
+
+        for name in INDEXES:
+            await conn.execute(index_ddl[name])
+        await conn.execute('ANALYZE')
+        after = await measure(conn, params, args.repeat)
+    finally:
+        await conn.close()
+
+    for name in QUERIES:
+        print(f'\n=== {name}')
+        print(f'--- без индексов: {before[name]["median_ms"]:.2f} ms')
+        print(before[name]['plan'])
+        print(f'--- с индексами: {after[name]["median_ms"]:.2f} ms')
+        print(after[name]['plan'])
+
+    print(f'\n{"query":<20}{"before, ms":>14}{"after, ms":>14}')
+    for name in QUERIES:
+        print(
+            f'{name:<20}{before[name]["median_ms"]:>14.2f}'
+            f'{after[name]["median_ms"]:>14.2f}'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--notes', type=int, default=1_000_000)
+    parser.add_argument('--tags', type=int, default=5000)
+    parser.add_argument('--tags-per-note', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--skip-seed', action='store_true')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,282 @@
+"""Нагрузочный тест API: вход, список, создание и смена тегов заметок.
+
+Работает с запущенным приложением, лимиты запросов нужно отключить
+(RATE_LIMIT_ENABLED=false), например стендом из docker-compose.bench.yml.
+Пользователи ``bench_load_<n>`` создаются через API и при первом запуске
+получают заметки с 0-30 тегами и длинным текстом через /notes/batch.
+Каждый сценарий выполняется ``--duration`` секунд в ``--concurrency``
+параллельных клиентов, результаты пишутся в JSON.
+
+Списки и поиск запрашиваются со случайными курсором, размером страницы и
+тегами, но после прогрева ответы в основном берутся из кэша заметок в
+Redis. Чтобы измерить чтение из базы, приложение запускают с
+NOTES_CACHE_TTL=0 и передают ``--no-cache``: это попадёт в параметры
+результата.
+
+    python -m benchmarks.load --url http://localhost:8000 --duration 20
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import aiohttp
+
+from benchmarks.report import print_table, summarize, write_results
+
+PASSWORD = 'bench_password'
+BATCH_SIZE = 500
+PAGE_SIZE = 50
+LIMITS = (10, 50, 100, 200)
+WORDS = (
+    'заметка план встреча задача идея список покупки отчёт проект код '
+    'релиз ревью тест база кэш запрос ответ пользователь бот тег поиск '
+    'note plan meeting task idea release review cache query user'
+).split()
+
+
+class BenchUser:
+    def __init__(self, username: str):
+        self.username = username
+        self.token = None
+        self.note_ids: list[int] = []
+        # курсоры начала страниц по PAGE_SIZE заметок, None - первая
+        self.cursors: list[str | None] = [None]
+
+    @property
+    def credentials(self) -> dict:
+        return {'username': self.username, 'password': PASSWORD}
+
+    @property
+    def headers(self) -> dict:
+        return {'Authorization': self.token}
+
+
+def make_text(rng: random.Random, args) -> str:
+    size = rng.randint(args.min_text, args.max_text)
+    words = []
+    while size > 0:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size -= len(word) + 1
+    return ' '.join(words)
+
+
+def make_tags(rng: random.Random, args) -> list[str]:
+    count = rng.randint(0, args.max_tags)
+    return [f'tag{i}' for i in rng.sample(range(args.tags), count)]
+
+
+def make_note(rng: random.Random, args) -> dict:
+    return {
+        'title': ' '.join(rng.choices(WORDS, k=rng.randint(1, 6))),
+        'text': make_text(rng, args),
+        'tags': make_tags(rng, args),
+    }
+
+
+async def check(resp):
+    if resp.status >= 400:
+        raise RuntimeError(
+            f'{resp.method} {resp.url.path}: {resp.status} '
+            f'{await resp.text()}'
+        )
+    return await resp.json()
+
+
+async def prepare_user(session, args, rng, user: BenchUser):
+    async with session.post(
+        f'{args.url}/api/v1/user/create', json=user.credentials
+    ) as resp:
+        created = resp.status == 200
+    async with session.post(
+        f'{args.url}/api/v1/refresh-jwt', json=user.credentials
+    ) as resp:
+        user.token = (await check(resp))['token']
+
+    # заметки получает только новый пользователь, повторный запуск
+    # работает с теми же данными
+    if created:
+        for start in range(0, args.notes, BATCH_SIZE):
+            count = min(BATCH_SIZE, args.notes - start)
+            batch = {'create': [make_note(rng, args) for _ in range(count)]}
+            async with session.post(
+                f'{args.url}/api/v1/notes/batch',
+                json=batch,
+                headers=user.headers,
+            ) as resp:
+                await check(resp)
+
+    cursor = None
+    while True:
+        params = {'limit': PAGE_SIZE, 'fields': 'id'}
+        if cursor:
+            params['cursor'] = cursor
+        async with session.get(
+            f'{args.url}/api/v1/notes', params=params, headers=user.headers
+        ) as resp:
+            page = await check(resp)
+        user.note_ids.extend(note['id'] for note in page['notes'])
+        cursor = page.get('next_cursor')
+        if not cursor:
+            break
+        user.cursors.append(cursor)
+
+
+async def seed(session, args) -> list[BenchUser]:
+    rng = random.Random(args.seed)
+    users = [BenchUser(f'bench_load_{n}') for n in range(args.users)]
+    started = time.perf_counter()
+    for user in users:
+        await prepare_user(session, args, rng, user)
+    print(f'seed: {time.perf_counter() - started:.1f}s')
+    return users
+
+
+def login(session, args, rng, user: BenchUser):
+    return session.post(
+        f'{args.url}/api/v1/refresh-jwt', json=user.credentials
+    )
+
+
+def page_params(rng: random.Random, user: BenchUser) -> dict:
+    params = {'limit': rng.choice(LIMITS)}
+    cursor = rng.choice(user.cursors)
+    if cursor:
+        params['cursor'] = cursor
+    return params
+
+
+def get_notes(session, args, rng, user: BenchUser):
+    return session.get(
+        f'{args.url}/api/v1/notes',
+        params=page_params(rng, user),
+        headers=user.headers,
+    )
+
+
+def search_notes(session, args, rng, user: BenchUser):
+    tags = [f'tag{i}' for i in rng.sample(range(args.tags), rng.randint(1, 3))]
+    return session.get(
+        f'{args.url}/api/v1/notes/search',
+        params={
+            **page_params(rng, user),
+            'tags': ','.join(tags),
+            'mode': rng.choice(('any', 'all')),
+        },
+        headers=user.headers,
+    )
+
+
+def create_note(session, args, rng, user: BenchUser):
+    return session.post(
+        f'{args.url}/api/v1/note/create',
+        json=make_note(rng, args),
+        headers=user.headers,
+    )
+
+
+def edit_tags_note(session, args, rng, user: BenchUser):
+    return session.put(
+        f'{args.url}/api/v1/note/edit-tags/{rng.choice(user.note_ids)}',
+        json=make_tags(rng, args),
+        headers=user.headers,
+    )
+
+
+SCENARIOS = {
+    'login': login,
+    'get_notes': get_notes,
+    'search_notes': search_notes,
+    'create_note': create_note,
+    'edit_tags_note': edit_tags_note,
+}
+
+
+async def worker(session, args, scenario, users, seed, deadline, stats):
+    rng = random.Random(seed)
+    latencies, errors = stats
+    while time.perf_counter() < deadline:
+        user = rng.choice(users)
+        started = time.perf_counter()
+        async with scenario(session, args, rng, user) as resp:
+            await resp.read()
+        if resp.status >= 400:
+            errors[resp.status] = errors.get(resp.status, 0) + 1
+        else:
+            latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def run_scenario(session, args, name: str, users) -> dict:
+    scenario = SCENARIOS[name]
+    if name == 'edit_tags_note':
+        users = [user for user in users if user.note_ids]
+
+    async def run(seconds: float, stats):
+        deadline = time.perf_counter() + seconds
+        await asyncio.gather(
+            *(
+                worker(session, args, scenario, users, n, deadline, stats)
+                for n in range(args.concurrency)
+            )
+        )
+
+    await run(args.warmup, ([], {}))
+    latencies, errors = [], {}
+    started = time.perf_counter()
+    await run(args.duration, (latencies, errors))
+    elapsed = time.perf_counter() - started
+    return summarize(
+        latencies,
+        elapsed,
+        'ms',
+        errors={str(status): n for status, n in sorted(errors.items())},
+    )
+
+
+async def main(args):
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        users = await seed(session, args)
+        results = {}
+        for name in args.scenarios:
+            results[name] = await run_scenario(session, args, name, users)
+
+    print_table(results)
+    for name, row in results.items():
+        if row['errors']:
+            print(f'{name}: ошибки {row["errors"]}')
+    params = {
+        name: value
+        for name, value in vars(args).items()
+        if name not in ('url', 'output')
+    }
+    write_results('load', results, params, args.output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument(
+        '--scenarios',
+        nargs='+',
+        choices=SCENARIOS,
+        default=list(SCENARIOS),
+    )
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--notes', type=int, default=500)
+    parser.add_argument('--tags', type=int, default=1000)
+    parser.add_argument('--max-tags', type=int, default=30)
+    parser.add_argument('--min-text', type=int, default=200)
+    parser.add_argument('--max-text', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='приложение запущено с NOTES_CACHE_TTL=0',
+    )
+    parser.add_argument('--output')
+    asyncio.run(main(parser.parse_args()))
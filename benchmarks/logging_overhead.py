@@ -0,0 +1,120 @@
+"""Пропускная способность API с разными настройками логирования.
+
+Для каждого режима поднимает отдельный процесс uvicorn с нужными LOG_*
+переменными и нагружает GET /api/v1/notes. Нужны база и Redis из .env;
+лимиты запросов в запущенном процессе отключаются.
+
+    python -m benchmarks.logging_overhead --duration 10 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+from benchmarks.login_latency import login
+from benchmarks.report import percentile
+
+MODES = {
+    'off': {'LOG_ENABLED': 'false'},
+    'sync': {'LOG_ENQUEUE': 'false'},
+    'enqueue': {'LOG_ENQUEUE': 'true'},
+    'enqueue+json': {'LOG_ENQUEUE': 'true', 'LOG_JSON': 'true'},
+    'enqueue+sampling': {'LOG_ENQUEUE': 'true', 'LOG_SAMPLING': 'INFO:0.01'},
+}
+
+
+def start_server(port: int, mode: dict) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        'LOG_LEVEL': 'INFO',
+        'RATE_LIMIT_ENABLED': 'false',
+        **mode,
+    }
+    return subprocess.Popen(
+        [
+            sys.executable,
+            '-m',
+            'uvicorn',
+            'src.asgi:create_web_app',
+            '--factory',
+            '--port',
+            str(port),
+            '--no-access-log',
+            '--log-level',
+            'warning',
+        ],
+        env=env,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(session, url: str):
+    for _ in range(100):
+        try:
+            async with session.get(f'{url}/docs') as resp:
+                if resp.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError('Сервер не запустился')
+
+
+async def worker(session, url: str, token: str, deadline: float, out):
+    headers = {'Authorization': token}
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        async with session.get(
+            f'{url}/api/v1/notes?limit=10', headers=headers
+        ) as resp:
+            await resp.read()
+        out.append((time.perf_counter() - started) * 1000)
+
+
+async def measure(args, mode: dict):
+    url = f'http://127.0.0.1:{args.port}'
+    server = start_server(args.port, mode)
+    try:
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            await wait_ready(session, url)
+            token = await login(session, url)
+            warmup = time.perf_counter() + 1
+            await worker(session, url, token, warmup, [])
+
+            latencies = []
+            deadline = time.perf_counter() + args.duration
+            await asyncio.gather(
+                *(
+                    worker(session, url, token, deadline, latencies)
+                    for _ in range(args.concurrency)
+                )
+            )
+    finally:
+        server.terminate()
+        server.wait()
+    return latencies
+
+
+async def main(args):
+    print(f'{"mode":>18}{"req/s":>10}{"p50, ms":>10}{"p99, ms":>10}')
+    for name, mode in MODES.items():
+        latencies = await measure(args, mode)
+        print(
+            f'{name:>18}{len(latencies) / args.duration:>10.0f}'
+            f'{statistics.median(latencies):>10.1f}'
+            f'{percentile(latencies, 99):>10.1f}'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8010)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
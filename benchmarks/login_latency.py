@@ -0,0 +1,94 @@
+"""Задержка GET /api/v1/notes при одновременных входах пользователей.
+
+Работает с запущенным приложением; лимиты запросов на время замера нужно
+отключить (RATE_LIMIT_ENABLED=false). Сначала измеряется задержка списка
+заметок без нагрузки, затем - пока параллельно идут запросы /refresh-jwt.
+
+    python -m benchmarks.login_latency --url http://localhost:8000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import aiohttp
+
+from benchmarks.report import percentile
+
+USERNAME = 'bench_login'
+PASSWORD = 'bench_password'
+
+
+async def login(session, url: str) -> str:
+    data = {'username': USERNAME, 'password': PASSWORD}
+    await session.post(f'{url}/api/v1/user/create', json=data)
+    async with session.post(f'{url}/api/v1/refresh-jwt', json=data) as resp:
+        return (await resp.json())['token']
+
+
+async def read_notes(session, url: str, token: str, requests: int, out):
+    headers = {'Authorization': token}
+    for _ in range(requests):
+        started = time.perf_counter()
+        async with session.get(f'{url}/api/v1/notes', headers=headers) as resp:
+            await resp.read()
+        out.append((time.perf_counter() - started) * 1000)
+
+
+async def keep_logging_in(session, url: str, stop: asyncio.Event, stats):
+    data = {'username': USERNAME, 'password': PASSWORD}
+    while not stop.is_set():
+        async with session.post(
+            f'{url}/api/v1/refresh-jwt', json=data
+        ) as resp:
+            await resp.read()
+            stats[resp.status] = stats.get(resp.status, 0) + 1
+
+
+async def measure(session, args, token: str, logins: int):
+    latencies = []
+    stop = asyncio.Event()
+    login_stats = {}
+    background = [
+        asyncio.create_task(
+            keep_logging_in(session, args.url, stop, login_stats)
+        )
+        for _ in range(logins)
+    ]
+    await asyncio.gather(
+        *(
+            read_notes(session, args.url, token, args.requests, latencies)
+            for _ in range(args.concurrency)
+        )
+    )
+    stop.set()
+    await asyncio.gather(*background)
+    return latencies, login_stats
+
+
+async def main(args):
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        token = await login(session, args.url)
+        results = {}
+        for logins in (0, args.logins):
+            results[logins] = await measure(session, args, token, logins)
+
+    print(
+        f'{"logins":>8}{"p50, ms":>10}{"p95, ms":>10}{"p99, ms":>10}  login statuses'
+    )
+    for logins, (latencies, login_stats) in results.items():
+        print(
+            f'{logins:>8}{statistics.median(latencies):>10.1f}'
+            f'{percentile(latencies, 95):>10.1f}'
+            f'{percentile(latencies, 99):>10.1f}  {login_stats or ""}'
+        )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--logins', type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,115 @@
+"""Микробенчмарки сериализации страницы заметок и проверки JWT.
+
+Без базы и Redis: страница собирается из сгенерированных строк того же
+вида, что отдаёт ``Note.get_note_rows``. ``all_notes_schema`` - прежний
+путь через pydantic, ``orjson_page`` - текущий ответ ``/notes``. Нужны
+SECRET_KEY и ALGORITHM_HASH из .env.
+
+    python -m benchmarks.micro --calls 2000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import jwt
+import orjson
+from pydantic import TypeAdapter
+
+from benchmarks.load import WORDS
+from benchmarks.report import print_table, summarize, write_results
+from config import LOGGER, settings
+from src.api_v1.schemas import AllNotesSchema
+from src.auth import check_token, rejected_token_cache, token_cache
+
+
+def make_rows(rng: random.Random, args) -> list[dict]:
+    now = datetime.now()
+    return [
+        {
+            'id': n,
+            'user_id': 1,
+            'title': ' '.join(rng.choices(WORDS, k=4)),
+            'text': ' '.join(rng.choices(WORDS, k=args.text_words)),
+            'tags': [
+                {'id': i, 'title': f'tag{i}'}
+                for i in rng.sample(range(1000), rng.randint(0, 30))
+            ],
+            'created_at': now - timedelta(minutes=n),
+            'updated_at': now,
+        }
+        for n in range(args.page_size)
+    ]
+
+
+def make_token(user_id: str, ttl: float = 3600) -> str:
+    return jwt.encode(
+        {'user_id': user_id, 'expires': time.time() + ttl},
+        settings.secret_key,
+        algorithm=settings.algorithm_hash,
+    )
+
+
+def measure(call, calls: int, prepare=None) -> dict:
+    """Время каждого вызова в микросекундах, ``prepare`` - вне замера."""
+    timings = []
+    for n in range(calls):
+        argument = prepare(n) if prepare else None
+        started = time.perf_counter_ns()
+        call(argument)
+        timings.append((time.perf_counter_ns() - started) / 1000)
+    return summarize(timings, sum(timings) / 1e6, 'us')
+
+
+def main(args):
+    # предупреждения о недействительных токенах не должны попасть в замер
+    LOGGER.disable('src')
+    rng = random.Random(args.seed)
+    rows = make_rows(rng, args)
+    page = {'notes': rows, 'next_cursor': None}
+    notes_adapter = TypeAdapter(list[AllNotesSchema])
+    valid = make_token('bench')
+    fresh = [make_token(f'bench{n}') for n in range(args.calls)]
+    invalid = [f'{token}x' for token in fresh]
+
+    def cold(tokens):
+        def prepare(n):
+            token_cache.clear()
+            rejected_token_cache.clear()
+            return tokens[n]
+
+        return prepare
+
+    check_token(valid)
+    benchmarks = {
+        'all_notes_schema': (
+            lambda _: notes_adapter.dump_json(
+                notes_adapter.validate_python(rows)
+            ),
+            None,
+        ),
+        'orjson_page': (lambda _: orjson.dumps(page), None),
+        'check_token_cached': (lambda _: check_token(valid), None),
+        'check_token_decode': (check_token, cold(fresh)),
+        'check_token_invalid': (check_token, cold(invalid)),
+    }
+    results = {}
+    for name, (call, prepare) in benchmarks.items():
+        measure(call, min(args.calls, 100), prepare)
+        results[name] = measure(call, args.calls, prepare)
+
+    print_table(results)
+    params = {
+        name: value for name, value in vars(args).items() if name != 'output'
+    }
+    write_results('micro', results, params, args.output)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--text-words', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output')
+    main(parser.parse_args())
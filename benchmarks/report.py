@@ -0,0 +1,84 @@
+"""Сводка замеров и запись результатов в JSON.
+
+Файл содержит коммит и окружение замера, по ним ``benchmarks.compare``
+сравнивает результаты разных коммитов.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def summarize(values: list[float], seconds: float, unit: str, **extra):
+    """Пропускная способность и перцентили значений в единицах ``unit``."""
+    if not values:
+        return {'count': 0, 'unit': unit, **extra}
+    return {
+        'count': len(values),
+        'throughput': len(values) / seconds,
+        'unit': unit,
+        'mean': statistics.fmean(values),
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': max(values),
+        **extra,
+    }
+
+
+def git(*args) -> str:
+    try:
+        return subprocess.run(
+            ['git', *args], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def environment() -> dict:
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD') or 'unknown',
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def print_table(results: dict):
+    print(
+        f'{"name":>22}{"count":>9}{"per s":>10}'
+        f'{"p50":>10}{"p95":>10}{"p99":>10}  unit'
+    )
+    for name, row in results.items():
+        if not row['count']:
+            print(f'{name:>22}{0:>9}')
+            continue
+        print(
+            f'{name:>22}{row["count"]:>9}{row["throughput"]:>10.1f}'
+            f'{row["p50"]:>10.3f}{row["p95"]:>10.3f}{row["p99"]:>10.3f}'
+            f'  {row["unit"]}'
+        )
+
+
+def write_results(kind: str, results: dict, params: dict, output=None):
+    """Пишет JSON, по умолчанию ``results/<kind>-<коммит>.json``."""
+    meta = {'kind': kind, 'params': params, **environment()}
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f'{kind}-{meta["commit"]}.json')
+    with open(output, 'w', encoding='utf8') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2)
+    print(f'\nРезультаты записаны в {output}')
+    return output
@@ -1,6 +1,14 @@
 import os
+import queue
+import random
+import sys
+import threading
+import time
+import traceback
+from contextlib import suppress
 from datetime import datetime
 
+import orjson
 from dotenv import load_dotenv
 from loguru import logger
 
@@ -16,29 +24,274 @@ class DatabaseConfig:
 
     db_url = f'postgresql+asyncpg://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}'
 
+    pool_size: int = int(os.getenv('DB_POOL_SIZE', 5))
+    max_overflow: int = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    pool_timeout: float = float(os.getenv('DB_POOL_TIMEOUT', 60))
+    pool_recycle: int = int(os.getenv('DB_POOL_RECYCLE', -1))
+    pool_pre_ping: bool = os.getenv('DB_POOL_PRE_PING', 'false') == 'true'
+    statement_cache_size: int = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 100))
+
 
 class Config:
     db_url: str = DatabaseConfig.db_url
+    db_pool_size: int = DatabaseConfig.pool_size
+    db_max_overflow: int = DatabaseConfig.max_overflow
+    db_pool_timeout: float = DatabaseConfig.pool_timeout
+    db_pool_recycle: int = DatabaseConfig.pool_recycle
+    db_pool_pre_ping: bool = DatabaseConfig.pool_pre_ping
+    db_statement_cache_size: int = DatabaseConfig.statement_cache_size
+    db_profile: bool = os.getenv('DB_PROFILE', 'false') == 'true'
+    db_slow_query_ms: float = float(os.getenv('DB_SLOW_QUERY_MS', 100))
+    db_repeat_threshold: int = int(os.getenv('DB_REPEAT_THRESHOLD', 3))
+    api_host: str = os.getenv('API_HOST', '0.0.0.0')
+    api_port: int = int(os.getenv('API_PORT', 8000))
+    api_workers: int = int(os.getenv('API_WORKERS', 1))
+    api_reload: bool = os.getenv('API_RELOAD', 'false') == 'true'
+    api_graceful_timeout: int = int(os.getenv('API_GRACEFUL_TIMEOUT', 30))
+    api_metrics_port: int = int(os.getenv('API_METRICS_PORT', 0))
     secret_key: str = os.getenv('SECRET_KEY')
     algorithm_hash: str = os.getenv('ALGORITHM_HASH')
     bot_token: str = os.getenv('BOT_TOKEN')
+    token_cache_size: int = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+    rejected_token_cache_size: int = int(
+        os.getenv('REJECTED_TOKEN_CACHE_SIZE', 1000)
+    )
+    token_negative_ttl: float = float(os.getenv('TOKEN_NEGATIVE_TTL', 30))
+    notes_cache_ttl: int = int(os.getenv('NOTES_CACHE_TTL', 300))
+    notes_cache_max_bytes: int = int(
+        os.getenv('NOTES_CACHE_MAX_BYTES', 1024 * 1024)
+    )
+    tag_cache_size: int = int(os.getenv('TAG_CACHE_SIZE', 50000))
+    bcrypt_rounds: int = int(os.getenv('BCRYPT_ROUNDS', 12))
+    password_hash_workers: int = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    password_hash_queue: int = int(os.getenv('PASSWORD_HASH_QUEUE', 32))
+    telegram_user_cache_size: int = int(
+        os.getenv('TELEGRAM_USER_CACHE_SIZE', 10000)
+    )
+    telegram_user_cache_ttl: float = float(
+        os.getenv('TELEGRAM_USER_CACHE_TTL', 60)
+    )
+    bot_mode: str = os.getenv('BOT_MODE', 'polling')
+    bot_fsm_storage: str = os.getenv('BOT_FSM_STORAGE', 'memory')
+    bot_fsm_ttl: int = int(os.getenv('BOT_FSM_TTL', 24 * 60 * 60))
+    webhook_url: str = os.getenv('WEBHOOK_URL', '')
+    webhook_path: str = os.getenv('WEBHOOK_PATH', '/telegram/webhook')
+    webhook_secret: str = os.getenv('WEBHOOK_SECRET', '')
+    webhook_host: str = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+    webhook_port: int = int(os.getenv('WEBHOOK_PORT', 8080))
+    webhook_workers: int = int(os.getenv('WEBHOOK_WORKERS', 1))
+    bot_notes_page_size: int = int(os.getenv('BOT_NOTES_PAGE_SIZE', 5))
+    bot_page_cache_size: int = int(os.getenv('BOT_PAGE_CACHE_SIZE', 10000))
+    bot_page_cache_ttl: float = float(os.getenv('BOT_PAGE_CACHE_TTL', 300))
+    bot_global_rate: float = float(os.getenv('BOT_GLOBAL_RATE', 30))
+    bot_chat_rate: float = float(os.getenv('BOT_CHAT_RATE', 1))
+    bot_group_rate: float = float(os.getenv('BOT_GROUP_RATE', 20 / 60))
+    bot_send_retries: int = int(os.getenv('BOT_SEND_RETRIES', 3))
+    bot_metrics_port: int = int(os.getenv('BOT_METRICS_PORT', 0))
+    bot_transport: str = os.getenv('BOT_TRANSPORT', 'http')
+    api_base_url: str = os.getenv('API_BASE_URL', 'http://localhost:8000')
+    api_connection_limit: int = int(os.getenv('API_CONNECTION_LIMIT', 100))
+    api_keepalive_timeout: float = float(
+        os.getenv('API_KEEPALIVE_TIMEOUT', 30)
+    )
+    api_timeout: float = float(os.getenv('API_TIMEOUT', 30))
+    api_connect_timeout: float = float(os.getenv('API_CONNECT_TIMEOUT', 5))
+    api_retries: int = int(os.getenv('API_RETRIES', 3))
+    api_retry_backoff: float = float(os.getenv('API_RETRY_BACKOFF', 0.2))
+    redis_url: str = f"redis://{os.getenv('REDIS_URL')}"
+    # отключается только на стенде бенчмарков, в .env не задаётся
+    rate_limit_enabled: bool = (
+        os.getenv('RATE_LIMIT_ENABLED', 'true') == 'true'
+    )
+    log_enabled: bool = os.getenv('LOG_ENABLED', 'true') == 'true'
+    log_level: str = os.getenv('LOG_LEVEL', 'DEBUG')
+    log_enqueue: bool = os.getenv('LOG_ENQUEUE', 'true') == 'true'
+    log_queue_size: int = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    log_json: bool = os.getenv('LOG_JSON', 'false') == 'true'
+    log_diagnose: bool = os.getenv('LOG_DIAGNOSE', 'false') == 'true'
+    log_sampling: str = os.getenv('LOG_SAMPLING', '')
+
+
+def parse_sampling(value: str) -> dict[str, float]:
+    """``DEBUG:0.01,INFO:0.1`` -> доля записей каждого уровня в логе."""
+    rates = {}
+    for item in filter(None, value.split(',')):
+        level, rate = item.split(':')
+        rates[level.strip().upper()] = float(rate)
+    return rates
+
+
+class DailyLogFile:
+    """Файл ``logs/<дата>.log``, новый каждый день, старые удаляются."""
+
+    def __init__(self, directory: str, retention_days: int):
+        self.directory = directory
+        self.retention = retention_days * 24 * 60 * 60
+        self.date = None
+        self.file = None
+
+    def write(self, text: str):
+        date = datetime.now().strftime('%Y-%m-%d')
+        if date != self.date:
+            self.open(date)
+        self.file.write(text)
+
+    def open(self, date: str):
+        if self.file:
+            self.file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self.date = date
+        self.file = open(
+            os.path.join(self.directory, f'{date}.log'), 'a', encoding='utf8'
+        )
+        cutoff = time.time() - self.retention
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            # старый файл одновременно удаляют все процессы API и бота
+            with suppress(FileNotFoundError):
+                if name.endswith('.log') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+
+    def flush(self):
+        if self.file:
+            self.file.flush()
+
+
+class BackgroundSink:
+    """Синк, который пишет в ``target`` из отдельного потока.
+
+    Вызывающий код только кладёт готовую строку в очередь процесса, без
+    сериализации записи, как при ``enqueue=True`` в loguru. Если поток не
+    успевает писать, строки сверх ``maxsize`` отбрасываются и
+    подсчитываются, ошибки записи не останавливают поток.
+    """
+
+    def __init__(self, target, maxsize: int):
+        self.target = target
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, message: str):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self):
+        while True:
+            # накопившиеся строки пишутся пачкой, flush один на пачку
+            batch = [self.queue.get()]
+            while batch[-1] is not None and not self.queue.empty():
+                batch.append(self.queue.get())
+            self.write_batch([m for m in batch if m is not None])
+            if batch[-1] is None:
+                return
+
+    def write_batch(self, messages: list[str]):
+        dropped, self.dropped = self.dropped, 0
+        if dropped:
+            messages.append(f'Очередь логов заполнена, пропущено {dropped}\n')
+        try:
+            for message in messages:
+                self.target.write(message)
+            self.target.flush()
+        except Exception as e:
+            with suppress(Exception):
+                print(
+                    f'Ошибка записи лога, потеряно до {len(messages)}: {e!r}',
+                    file=sys.__stderr__,
+                )
+
+    def stop(self):
+        # loguru вызывает при удалении синка, в том числе при выходе
+        self.queue.put(None)
+        self.thread.join()
 
 
 class LoggerConfig:
+    """Синки loguru: stderr и файл за день.
+
+    С ``LOG_ENQUEUE=true`` синки пишут из отдельного потока, в цикле
+    событий остаётся только форматирование. ``LOG_JSON=true`` - по
+    JSON-объекту на строку, ``LOG_SAMPLING`` пропускает в лог лишь долю
+    записей указанных уровней, ``LOG_DIAGNOSE=false`` отключает значения
+    переменных в трассировках.
+    """
+
     logger = logger
 
-    def __init__(self) -> None:
+    def __init__(self, config: Config) -> None:
+        self.config = config
+        self.rates = parse_sampling(config.log_sampling)
+        self.logger.remove()
+        if not config.log_enabled:
+            return
+
+        options = {
+            'level': config.log_level,
+            'backtrace': True,
+            'diagnose': config.log_diagnose,
+            'filter': self.sample if self.rates else None,
+        }
+        if config.log_json:
+            options['format'] = self.json_format
+
+        if config.log_enqueue:
+            self.logger.add(
+                BackgroundSink(sys.stderr, config.log_queue_size), **options
+            )
+            self.logger.add(
+                BackgroundSink(
+                    DailyLogFile('logs', retention_days=10),
+                    config.log_queue_size,
+                ),
+                **options,
+            )
+            return
+
         current_date = datetime.now().strftime('%Y-%m-%d')
         log_file = f'logs/{current_date}.log'
 
+        self.logger.add(sys.stderr, **options)
         self.logger.add(
             log_file,
-            backtrace=True,
-            diagnose=True,
             rotation='00:00',
             retention='10 days',
+            **options,
+        )
+
+    def sample(self, record) -> bool:
+        # решение принимается один раз на запись, общее для всех синков
+        extra = record['extra']
+        if '_sampled' not in extra:
+            rate = self.rates.get(record['level'].name)
+            extra['_sampled'] = rate is None or random.random() < rate
+        return extra['_sampled']
+
+    @staticmethod
+    def json_format(record) -> str:
+        payload = {
+            'time': record['time'].isoformat(),
+            'level': record['level'].name,
+            'logger': record['name'],
+            'function': record['function'],
+            'line': record['line'],
+            'message': record['message'],
+        }
+        payload.update(
+            (key, value)
+            for key, value in record['extra'].items()
+            if not key.startswith('_')
         )
+        if record['exception']:
+            payload['exception'] = ''.join(
+                traceback.format_exception(*record['exception'])
+            )
+        record['extra']['_json'] = orjson.dumps(payload, default=str).decode()
+        return '{extra[_json]}\n'
 
 
 settings = Config()
-LOGGER = LoggerConfig().logger
+LOGGER = LoggerConfig(settings).logger
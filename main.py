@@ -1,16 +1,101 @@
+"""Запуск API и бота с перезапуском упавшего процесса.
+
+SIGTERM и SIGINT передаются обоим процессам, после чего супервизор ждёт
+их завершения: uvicorn дорабатывает начатые запросы, бот - апдейты.
+"""
+import os
+import signal
 import subprocess
-from concurrent.futures import ProcessPoolExecutor
+import sys
+import time
+from contextlib import suppress
+
+from config import LOGGER, settings
+
+SERVICES = {
+    'api': [sys.executable, '-m', 'src.asgi'],
+    'bot': [sys.executable, '-m', 'src.telegram.bot'],
+}
+# процесс, проработавший дольше, считается стабильным: пауза сбрасывается
+STABLE_AFTER = 60
+MAX_BACKOFF = 30
+
+
+class Supervisor:
+    def __init__(self, services: dict[str, list[str]]):
+        self.services = services
+        self.processes: dict[str, subprocess.Popen] = {}
+        self.started: dict[str, float] = {}
+        self.backoff = {name: 1 for name in services}
+        self.restart_at: dict[str, float] = {}
+        self.stopping = False
+        self.signalled: set[int] = set()
+
+    def start(self, name: str):
+        # своя группа процессов: после падения можно добить её воркеров
+        self.processes[name] = subprocess.Popen(
+            self.services[name], start_new_session=True
+        )
+        self.started[name] = time.monotonic()
+        LOGGER.info(f'Запущен {name}, pid {self.processes[name].pid}')
+
+    def stop(self, signum, _frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        LOGGER.info(f'Получен сигнал {signum}, остановка процессов')
+        self.terminate()
+
+    def terminate(self):
+        # повторный SIGTERM uvicorn воспринимает как немедленную остановку
+        for process in list(self.processes.values()):
+            if process.poll() is None and process.pid not in self.signalled:
+                self.signalled.add(process.pid)
+                process.send_signal(signal.SIGTERM)
+
+    def check(self, name: str):
+        process = self.processes.get(name)
+        if process is None:
+            if time.monotonic() >= self.restart_at.get(name, 0):
+                self.start(name)
+            return
+        if process.poll() is None:
+            return
 
+        uptime = time.monotonic() - self.started[name]
+        if uptime > STABLE_AFTER:
+            self.backoff[name] = 1
+        delay = self.backoff[name]
+        self.backoff[name] = min(delay * 2, MAX_BACKOFF)
+        LOGGER.error(
+            f'{name} завершился с кодом {process.returncode}, '
+            f'перезапуск через {delay} с'
+        )
+        with suppress(ProcessLookupError):
+            os.killpg(process.pid, signal.SIGKILL)
+        del self.processes[name]
+        self.restart_at[name] = time.monotonic() + delay
 
-def start_fastapp():
-    subprocess.call(['python', '-m', 'src.asgi'])
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
 
+        while not self.stopping:
+            for name in self.services:
+                self.check(name)
+            time.sleep(0.5)
 
-def start_bot():
-    subprocess.call(['python', '-m', 'src.telegram.bot'])
+        # процесс мог запуститься, пока обрабатывался сигнал
+        self.terminate()
+        deadline = time.monotonic() + settings.api_graceful_timeout + 5
+        for name, process in self.processes.items():
+            try:
+                process.wait(max(deadline - time.monotonic(), 0))
+            except subprocess.TimeoutExpired:
+                LOGGER.warning(f'{name} не завершился вовремя, kill')
+                os.killpg(process.pid, signal.SIGKILL)
+                process.wait()
 
 
 if __name__ == '__main__':
-    with ProcessPoolExecutor() as pool:
-        pool.submit(start_bot)
-        pool.submit(start_fastapp)
+    Supervisor(SERVICES).run()
@@ -0,0 +1,87 @@
+"""Added notes, tags and association indexes
+
+Revision ID: 3e008541210f
+Revises: caa74cc2d7b1
+Create Date: 2026-10-18 12:05:41.173402
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '3e008541210f'
+down_revision: Union[str, None] = 'caa74cc2d7b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Tag.create_tags мог вставлять одинаковые теги повторно: перед
+    # уникальным индексом переносим связи на самый ранний тег и удаляем дубли
+    op.execute(
+        """
+        CREATE TEMP TABLE tags_duplicates ON COMMIT DROP AS
+        SELECT id, keep_id
+        FROM (
+            SELECT id, min(id) OVER (PARTITION BY title) AS keep_id
+            FROM tags
+        ) AS t
+        WHERE id <> keep_id
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO notes_tags_table_association (notes_id, tags_id)
+        SELECT a.notes_id, d.keep_id
+        FROM notes_tags_table_association AS a
+        JOIN tags_duplicates AS d ON d.id = a.tags_id
+        ON CONFLICT DO NOTHING
+        """
+    )
+    op.execute(
+        """
+        DELETE FROM notes_tags_table_association
+        WHERE tags_id IN (SELECT id FROM tags_duplicates)
+        """
+    )
+    op.execute('DELETE FROM tags WHERE id IN (SELECT id FROM tags_duplicates)')
+
+    # индексы строятся CONCURRENTLY, чтобы не блокировать запись в таблицы
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_notes_user_id_created_at_id',
+            'notes',
+            ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_tags_title',
+            'tags',
+            ['title'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_notes_tags_table_association_tags_id_notes_id',
+            'notes_tags_table_association',
+            ['tags_id', 'notes_id'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_notes_tags_table_association_tags_id_notes_id',
+            table_name='notes_tags_table_association',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_tags_title', table_name='tags', postgresql_concurrently=True
+        )
+        op.drop_index(
+            'ix_notes_user_id_created_at_id',
+            table_name='notes',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,52 @@
+"""Added notes search_vector
+
+Revision ID: 9c41f7d2ab53
+Revises: 3e008541210f
+Create Date: 2026-10-18 14:32:09.618205
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '9c41f7d2ab53'
+down_revision: Union[str, None] = '3e008541210f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'notes',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "setweight(to_tsvector('russian', coalesce(title, '')), 'A')"
+                " || setweight(to_tsvector('russian', coalesce(text, '')),"
+                " 'B')",
+                persisted=True,
+            ),
+            nullable=True,
+        ),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_notes_search_vector',
+            'notes',
+            ['search_vector'],
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_notes_search_vector',
+            table_name='notes',
+            postgresql_concurrently=True,
+        )
+    op.drop_column('notes', 'search_vector')
@@ -0,0 +1,52 @@
+from fastapi import Request, Response
+from fastapi_limiter import FastAPILimiter
+from fastapi_limiter.depends import RateLimiter
+
+
+class WeightedRateLimiter(RateLimiter):
+    """RateLimiter, который списывает с лимита вес запроса, а не единицу.
+
+    Вес известен только после разбора тела, поэтому лимитер вызывается
+    из обработчика через ``hit``, а не как зависимость маршрута.
+    """
+
+    lua_script = """local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local expire_time = ARGV[2]
+local weight = tonumber(ARGV[3])
+
+local current = tonumber(redis.call('get', key) or "0")
+if current + weight > limit then
+    local ttl = redis.call('PTTL', key)
+    if ttl > 0 then
+        return ttl
+    end
+    return tonumber(expire_time)
+end
+if current > 0 then
+    redis.call('INCRBY', key, weight)
+else
+    redis.call('SET', key, weight, 'px', expire_time)
+end
+return 0"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._script = None
+
+    async def hit(self, request: Request, response: Response, weight: int):
+        if self._script is None:
+            self._script = FastAPILimiter.redis.register_script(
+                self.lua_script
+            )
+
+        identifier = self.identifier or FastAPILimiter.identifier
+        callback = self.callback or FastAPILimiter.http_callback
+        rate_key = await identifier(request)
+        key = f'{FastAPILimiter.prefix}:weighted:{rate_key}'
+
+        pexpire = await self._script(
+            keys=[key], args=[self.times, self.milliseconds, weight]
+        )
+        if pexpire != 0:
+            return await callback(request, response, pexpire)
@@ -1,23 +1,157 @@
-from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from contextlib import aclosing
+from typing import Literal
+
+import orjson
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from fastapi_limiter.depends import RateLimiter
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import LOGGER
-from src.api_v1.schemas import AllNotesSchema, EditNoteBody, NewNoteSchema
+from config import LOGGER, settings
+from src.api_v1.limits import WeightedRateLimiter
+from src.api_v1.pagination import (
+    decode_cursor,
+    decode_rank_cursor,
+    encode_rank_cursor,
+)
+from src.api_v1.schemas import (
+    BATCH_MAX_WEIGHT,
+    BatchItemResultSchema,
+    BatchNotesSchema,
+    BatchResultSchema,
+    EditNoteBody,
+    FullTextHitSchema,
+    FullTextPageSchema,
+    NewNoteSchema,
+    SlimNotesPageSchema,
+)
 from src.auth import JWTBearer
-from src.database.models import Note, Tag
+from src.cache import notes_cache
+from src.database.base import get_async_session
+from src.database.models import NOTE_FIELDS, Note, Tag
+from src.database.transfer import (
+    FORMATS,
+    ImportFormatError,
+    export_notes,
+    import_notes,
+)
+from src.services import (
+    add_note,
+    iter_notes,
+    page_notes,
+    search_tag_ids,
+    user_id_from_payload,
+)
 
 router = APIRouter(prefix='/api/v1')
+TRANSFER_MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+batch_rate_limiter = WeightedRateLimiter(times=BATCH_MAX_WEIGHT, minutes=1)
 
 
 async def get_current_user_id(request: Request):
-    user_id = request.state.payload['user_id']
+    return user_id_from_payload(request.state.payload)
+
+
+def get_note_fields(
+    fields: str | None = Query(None, description='Поля заметки через запятую'),
+) -> tuple[str, ...]:
+    if not fields:
+        return NOTE_FIELDS
+
+    requested = {name.strip() for name in fields.split(',')}
+    unknown = requested.difference(NOTE_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Unknown fields: {", ".join(sorted(unknown))}',
+        )
+    return tuple(name for name in NOTE_FIELDS if name in requested)
+
+
+async def notes_as_ndjson(
+    user_id: int, position: tuple | None, fields: tuple[str, ...], **filters
+):
+    async for notes in iter_notes(user_id, fields, position, **filters):
+        yield b''.join(
+            orjson.dumps(note, option=orjson.OPT_APPEND_NEWLINE)
+            for note in notes
+        )
 
-    if user_id and isinstance(user_id, int):
-        return user_id
 
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND, detail='User not found'
+async def caching_ndjson(key: str, chunks):
+    """Отдаёт части ответа и копирует их в кэш.
+
+    Ответ сохраняется, только если выдан целиком и не больше
+    ``NOTES_CACHE_MAX_BYTES``; больший просто отдаётся дальше.
+    """
+    parts, size = [], 0
+    async with aclosing(chunks):
+        async for chunk in chunks:
+            yield chunk
+            if parts is None:
+                continue
+            size += len(chunk)
+            if size > settings.notes_cache_max_bytes:
+                parts = None
+            else:
+                parts.append(chunk)
+
+    if parts is not None:
+        await notes_cache.store(key, b''.join(parts))
+
+
+async def notes_page_body(
+    session: AsyncSession,
+    user_id: int,
+    limit: int,
+    position: tuple | None,
+    fields: tuple[str, ...],
+    **filters,
+):
+    page = await page_notes(
+        user_id, limit, position, fields, session, **filters
     )
+    return orjson.dumps(page)
+
+
+async def notes_page(
+    session: AsyncSession,
+    user_id: int,
+    limit: int,
+    cursor: str | None,
+    stream: bool,
+    fields: tuple[str, ...],
+    **filters,
+):
+    position = decode_cursor(cursor) if cursor else None
+    variant = (stream, limit, cursor, fields, sorted(filters.items()))
+
+    if stream:
+        key, body = await notes_cache.lookup(user_id, variant)
+        if body is not None:
+            return Response(body, media_type='application/x-ndjson')
+        chunks = notes_as_ndjson(user_id, position, fields, **filters)
+        if key is not None:
+            chunks = caching_ndjson(key, chunks)
+        return StreamingResponse(chunks, media_type='application/x-ndjson')
+
+    body = await notes_cache.get_or_load(
+        user_id,
+        variant,
+        lambda: notes_page_body(
+            session, user_id, limit, position, fields, **filters
+        ),
+    )
+    return Response(body, media_type='application/json')
 
 
 @router.get(
@@ -27,13 +161,93 @@ async def get_current_user_id(request: Request):
         Depends(RateLimiter(times=2, seconds=5)),
     ],
     tags=['notes'],
-    response_model=list[AllNotesSchema],
+    response_model=SlimNotesPageSchema,
 )
-async def get_notes(user_id: int = Depends(get_current_user_id)):
-    notes = await Note.get_all_notes(user_id)
+async def get_notes(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = None,
+    stream: bool = False,
+    fields: tuple[str, ...] = Depends(get_note_fields),
+    user_id: int = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_async_session),
+):
     LOGGER.info(f'Запрос заметок для пользователя: {user_id}')
 
-    return [AllNotesSchema.model_validate(note) for note in notes]
+    return await notes_page(session, user_id, limit, cursor, stream, fields)
+
+
+@router.get(
+    '/notes/search',
+    dependencies=[
+        Depends(JWTBearer()),
+        Depends(RateLimiter(times=2, seconds=5)),
+    ],
+    tags=['notes'],
+    response_model=SlimNotesPageSchema,
+)
+async def search_notes(
+    tags: str = Query(..., description='Теги через запятую'),
+    mode: Literal['any', 'all'] = 'any',
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = None,
+    stream: bool = False,
+    fields: tuple[str, ...] = Depends(get_note_fields),
+    user_id: int = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_async_session),
+):
+    LOGGER.info(f'Поиск заметок по тегам {tags} пользователем {user_id}')
+
+    tag_ids = await search_tag_ids(tags, mode == 'all', session)
+    if tag_ids is None:
+        if stream:
+            return StreamingResponse(
+                iter(()), media_type='application/x-ndjson'
+            )
+        return SlimNotesPageSchema(notes=[])
+
+    return await notes_page(
+        session,
+        user_id,
+        limit,
+        cursor,
+        stream,
+        fields,
+        tag_ids=tag_ids,
+        match_all=mode == 'all',
+    )
+
+
+@router.get(
+    '/notes/fulltext',
+    dependencies=[
+        Depends(JWTBearer()),
+        Depends(RateLimiter(times=2, seconds=5)),
+    ],
+    tags=['notes'],
+    response_model=FullTextPageSchema,
+)
+async def full_text_search(
+    q: str = Query(..., min_length=1, max_length=255),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    user_id: int = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_async_session),
+):
+    position = decode_rank_cursor(cursor) if cursor else None
+    LOGGER.info(f'Полнотекстовый поиск "{q}" пользователем {user_id}')
+
+    hits = await Note.full_text_search(
+        user_id, q, limit + 1, position, session
+    )
+    next_cursor = None
+    if len(hits) > limit:
+        hits = hits[:limit]
+        next_cursor = encode_rank_cursor(hits[-1].rank, hits[-1].id)
+
+    return FullTextPageSchema(
+        notes=[FullTextHitSchema.model_validate(hit) for hit in hits],
+        next_cursor=next_cursor,
+    )
 
 
 @router.post(
@@ -45,12 +259,11 @@ async def get_notes(user_id: int = Depends(get_current_user_id)):
     tags=['notes'],
 )
 async def create_note(
-    note: NewNoteSchema, user_id: int = Depends(get_current_user_id)
+    note: NewNoteSchema,
+    user_id: int = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    tags = await Tag.get_tags_by_title(note.tags)
-    new_note = await Note.create_note(user_id, note.title, note.text, tags)
-
-    LOGGER.info(f'Создана новая заметка: {new_note} пользователем {user_id}')
+    new_note = await add_note(user_id, note, session)
 
     if new_note:
         return {'status': True}
@@ -65,9 +278,17 @@ async def create_note(
     tags=['notes'],
 )
 async def delete_note(
-    note_id: int, user_id: int = Depends(get_current_user_id)
+    note_id: int,
+    user_id: int = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    await Note.delete_note(note_id)
+    if not await Note.delete_note(note_id, user_id, session):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail='Access to the note is forbidden',
+        )
+    await session.commit()
+    await notes_cache.invalidate(user_id)
     LOGGER.info(f'Заметка {note_id} удалена пользователем {user_id}')
 
     return {'status': True}
@@ -85,19 +306,21 @@ async def edit_note(
     note_id: int,
     note_body: EditNoteBody,
     user_id: int = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_async_session),
 ):
     text = note_body.text
 
-    user_notes = await Note.get_note(user_id)
-    user_notes_ids = [note.id for note in user_notes] if user_notes else []
-
-    if note_id not in user_notes_ids:
+    # заметка остаётся в identity map сессии для последующего изменения
+    note = await Note.get_user_note(note_id, user_id, session)
+    if not note:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail='Access to the note is forbidden',
         )
 
-    await Note.edit_note(note_id, text)
+    await Note.edit_note(note_id, text, session)
+    await session.commit()
+    await notes_cache.invalidate(user_id)
     LOGGER.info(f'Заметка {note_id} отредактирована пользователем {user_id}')
 
     return {'status': True}
@@ -112,20 +335,171 @@ async def edit_note(
     tags=['notes'],
 )
 async def edit_tags_note(
-    tags: list[str], note_id: int, user_id: int = Depends(get_current_user_id)
+    tags: list[str],
+    note_id: int,
+    user_id: int = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    user_notes = await Note.get_note(user_id)
-    user_notes_ids = [note.id for note in user_notes] if user_notes else []
-
-    if note_id not in user_notes_ids:
+    # заметка остаётся в identity map сессии для последующего изменения
+    note = await Note.get_user_note(note_id, user_id, session)
+    if not note:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail='Access to the note is forbidden',
         )
 
-    await Note.edit_tags_note(note_id, tags)
+    await Note.edit_tags_note(note_id, tags, session)
+    await session.commit()
+    await notes_cache.invalidate(user_id)
     LOGGER.info(
         f'Для заметки {note_id} заданы новые теги {tags} пользователем {user_id}'
     )
 
     return {'status': True}
+
+
+@router.post(
+    '/notes/batch',
+    dependencies=[Depends(JWTBearer())],
+    tags=['notes'],
+    response_model=BatchResultSchema,
+)
+async def batch_notes(
+    batch: BatchNotesSchema,
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_async_session),
+):
+    await batch_rate_limiter.hit(request, response, max(batch.weight, 1))
+
+    note_ids = [item.id for item in batch.edit + batch.edit_tags]
+    owned = set()
+    if note_ids or batch.delete:
+        owned = await Note.get_user_note_ids(
+            note_ids + batch.delete, user_id, session
+        )
+    forbidden = BatchItemResultSchema(
+        status=False, detail='Access to the note is forbidden'
+    )
+
+    titles = [
+        title for item in batch.create + batch.edit_tags for title in item.tags
+    ]
+    tag_ids = await Tag.resolve_ids(titles, session)
+
+    result = BatchResultSchema()
+    if batch.create:
+        created = await Note.create_notes(
+            user_id,
+            [
+                {
+                    'title': note.title,
+                    'text': note.text,
+                    'tag_ids': [tag_ids[title] for title in note.tags],
+                }
+                for note in batch.create
+            ],
+            session,
+        )
+        result.create = [
+            BatchItemResultSchema(id=id_, status=True) for id_ in created
+        ]
+
+    edits = {item.id: item.text for item in batch.edit if item.id in owned}
+    if edits:
+        await Note.edit_notes(edits, session)
+
+    new_tags = {
+        item.id: [tag_ids[title] for title in item.tags]
+        for item in batch.edit_tags
+        if item.id in owned
+    }
+    if new_tags:
+        await Note.set_notes_tags(new_tags, session)
+
+    deleted = [id_ for id_ in batch.delete if id_ in owned]
+    if deleted:
+        await Note.delete_notes(deleted, session)
+
+    for name, ids in (
+        ('edit', [item.id for item in batch.edit]),
+        ('edit_tags', [item.id for item in batch.edit_tags]),
+        ('delete', batch.delete),
+    ):
+        setattr(
+            result,
+            name,
+            [
+                BatchItemResultSchema(id=id_, status=True)
+                if id_ in owned
+                else forbidden.model_copy(update={'id': id_})
+                for id_ in ids
+            ],
+        )
+
+    await session.commit()
+    await notes_cache.invalidate(user_id)
+    LOGGER.info(
+        f'Пакетная обработка заметок пользователем {user_id}: '
+        f'создано {len(result.create)}, изменено {len(edits)}, '
+        f'теги изменены у {len(new_tags)}, удалено {len(deleted)}'
+    )
+
+    return result
+
+
+@router.get(
+    '/notes/export',
+    dependencies=[
+        Depends(JWTBearer()),
+        Depends(RateLimiter(times=2, minutes=1)),
+    ],
+    tags=['notes'],
+)
+async def export_user_notes(
+    format: Literal[FORMATS] = 'ndjson',
+    gzip: bool = False,
+    user_id: int = Depends(get_current_user_id),
+):
+    LOGGER.info(f'Выгрузка заметок пользователя {user_id} в {format}')
+
+    filename = f'notes.{format}' + ('.gz' if gzip else '')
+    media_type = 'application/gzip' if gzip else TRANSFER_MEDIA_TYPES[format]
+    return StreamingResponse(
+        export_notes(user_id, format, gzip),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename={filename}'},
+    )
+
+
+@router.post(
+    '/notes/import',
+    dependencies=[
+        Depends(JWTBearer()),
+        Depends(RateLimiter(times=2, minutes=1)),
+    ],
+    tags=['notes'],
+)
+async def import_user_notes(
+    request: Request,
+    format: Literal[FORMATS] = 'ndjson',
+    gzip: bool = False,
+    content_encoding: str | None = Header(None),
+    user_id: int = Depends(get_current_user_id),
+    session: AsyncSession = Depends(get_async_session),
+):
+    compressed = gzip or content_encoding == 'gzip'
+    try:
+        imported = await import_notes(
+            user_id, request.stream(), format, compressed, session
+        )
+    except ImportFormatError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=str(e)
+        )
+    await session.commit()
+    await notes_cache.invalidate(user_id)
+    LOGGER.info(f'Импортировано {imported} заметок пользователем {user_id}')
+
+    return {'status': True, 'imported': imported}
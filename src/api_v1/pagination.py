@@ -0,0 +1,47 @@
+import base64
+import binascii
+from datetime import datetime
+
+from fastapi import HTTPException, status
+
+
+def _encode(*parts) -> str:
+    raw = '|'.join(str(part) for part in parts).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _decode(cursor: str) -> list[str]:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    return base64.urlsafe_b64decode(padded).decode().split('|')
+
+
+def _invalid_cursor():
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor'
+    )
+
+
+def encode_cursor(created_at: datetime, id_: int) -> str:
+    """Курсор keyset-пагинации по паре (created_at, id)."""
+    return _encode(created_at.isoformat(), id_)
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, id_ = _decode(cursor)
+        return datetime.fromisoformat(created_at), int(id_)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise _invalid_cursor()
+
+
+def encode_rank_cursor(rank: float, id_: int) -> str:
+    """Курсор полнотекстового поиска по паре (rank, id)."""
+    return _encode(repr(rank), id_)
+
+
+def decode_rank_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        rank, id_ = _decode(cursor)
+        return float(rank), int(id_)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise _invalid_cursor()
@@ -1,6 +1,9 @@
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, model_validator
+
+# лимит веса пакетов в минуту, больший пакет не пройдёт никогда
+BATCH_MAX_WEIGHT = 1000
 
 
 class UserCreateSchema(BaseModel):
@@ -42,6 +45,39 @@ class AllNotesSchema(BaseModel):
         from_attributes = True
 
 
+class SlimNoteSchema(BaseModel):
+    """Заметка в списке: в ответе только поля из параметра fields."""
+
+    id: int | None = None
+    user_id: int | None = None
+    title: str | None = None
+    text: str | None = None
+    tags: list[TagSchema] | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+
+
+class SlimNotesPageSchema(BaseModel):
+    notes: list[SlimNoteSchema]
+    next_cursor: str | None = None
+
+
+class FullTextHitSchema(BaseModel):
+    id: int
+    title: str
+    snippet: str
+    rank: float
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class FullTextPageSchema(BaseModel):
+    notes: list[FullTextHitSchema]
+    next_cursor: str | None = None
+
+
 class NewNoteSchema(BaseModel):
     title: str
     text: str
@@ -50,3 +86,50 @@ class NewNoteSchema(BaseModel):
 
 class EditNoteBody(BaseModel):
     text: str
+
+
+class BatchEditNoteSchema(BaseModel):
+    id: int
+    text: str
+
+
+class BatchEditTagsSchema(BaseModel):
+    id: int
+    tags: list[str]
+
+
+class BatchNotesSchema(BaseModel):
+    create: list[NewNoteSchema] = Field(default=[], max_length=500)
+    edit: list[BatchEditNoteSchema] = Field(default=[], max_length=500)
+    edit_tags: list[BatchEditTagsSchema] = Field(default=[], max_length=500)
+    delete: list[int] = Field(default=[], max_length=500)
+
+    @property
+    def weight(self) -> int:
+        return (
+            len(self.create)
+            + len(self.edit)
+            + len(self.edit_tags)
+            + len(self.delete)
+        )
+
+    @model_validator(mode='after')
+    def check_weight(self):
+        if self.weight > BATCH_MAX_WEIGHT:
+            raise ValueError(
+                f'Batch may contain at most {BATCH_MAX_WEIGHT} operations'
+            )
+        return self
+
+
+class BatchItemResultSchema(BaseModel):
+    id: int | None = None
+    status: bool
+    detail: str | None = None
+
+
+class BatchResultSchema(BaseModel):
+    create: list[BatchItemResultSchema] = []
+    edit: list[BatchItemResultSchema] = []
+    edit_tags: list[BatchItemResultSchema] = []
+    delete: list[BatchItemResultSchema] = []
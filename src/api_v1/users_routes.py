@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi_limiter.depends import RateLimiter
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import LOGGER
 from src.api_v1.schemas import (
@@ -7,7 +8,10 @@ from src.api_v1.schemas import (
     UserCreateSchema,
     UserResponseSchema,
 )
+from src.database.base import get_async_session
 from src.database.models import User
+from src.passwords import PasswordHasherBusy
+from src.services import issue_token, service_busy
 
 router = APIRouter(prefix='/api/v1')
 
@@ -18,14 +22,21 @@ router = APIRouter(prefix='/api/v1')
     response_model=UserResponseSchema,
     tags=['user'],
 )
-async def create_user(user: UserCreateSchema):
-    user = await User.add_user(user.username, user.password)
+async def create_user(
+    user: UserCreateSchema,
+    session: AsyncSession = Depends(get_async_session),
+):
+    try:
+        user = await User.add_user(user.username, user.password, session)
+    except PasswordHasherBusy:
+        raise service_busy()
 
     if not user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail='Username already registered',
         )
+    await session.commit()
 
     LOGGER.info(f'Создан пользователь {user.username} - {user.id}')
     return UserResponseSchema.model_validate(user)
@@ -36,13 +47,10 @@ async def create_user(user: UserCreateSchema):
     dependencies=[Depends(RateLimiter(times=2, seconds=10))],
     tags=['user'],
 )
-async def login(user: AuthUserSchema):
-    token = await User.new_jwt_token(user.username, user.password)
-
-    if not token:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail='User not found'
-        )
-    LOGGER.info(f'Вход в систему: {user.username}')
+async def login(
+    user: AuthUserSchema,
+    session: AsyncSession = Depends(get_async_session),
+):
+    token = await issue_token(user.username, user.password, session)
 
     return {'token': f'Bearer {token}'}
@@ -3,32 +3,89 @@ from contextlib import asynccontextmanager
 
 import redis.asyncio as redis
 import uvicorn
-from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi_limiter import FastAPILimiter
 
+from config import LOGGER, settings
 from src.api_v1.notes_routes import router as users_notes
 from src.api_v1.users_routes import router as users_routes
+from src.cache import notes_cache, tag_cache
+from src.database.base import engine
+from src.database.models import Tag
+from src.database.profiler import QueryProfilerMiddleware
+from src.metrics import (
+    MetricsMiddleware,
+    mark_worker_stopped,
+    prepare_multiprocess_metrics,
+    start_metrics_server,
+)
 
-load_dotenv()
-redis_url = os.getenv('REDIS_URL')
+
+async def skip_rate_limit(request: Request, response: Response, pexpire: int):
+    """Превышение лимита не отклоняется: RATE_LIMIT_ENABLED=false."""
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
-    redis_connection = redis.from_url(f'redis://{redis_url}', encoding='utf8')
-    await FastAPILimiter.init(redis_connection)
+    """Подключения воркера: Redis здесь, пул базы создаётся при импорте.
+
+    Каждый воркер uvicorn - отдельный процесс со своим пулом подключений и
+    клиентом Redis. При остановке они закрываются после того, как uvicorn
+    дождётся незавершённых запросов.
+    """
+    redis_connection = redis.from_url(settings.redis_url, encoding='utf8')
+    if settings.rate_limit_enabled:
+        await FastAPILimiter.init(redis_connection)
+    else:
+        LOGGER.warning('Лимиты запросов отключены: RATE_LIMIT_ENABLED=false')
+        await FastAPILimiter.init(
+            redis_connection, http_callback=skip_rate_limit
+        )
+    notes_cache.init(redis_connection)
+    tag_cache.update(await Tag.get_title_ids(settings.tag_cache_size))
+    LOGGER.info(f'Воркер API {os.getpid()} запущен')
     yield
     await FastAPILimiter.close()
+    await engine.dispose()
+    mark_worker_stopped()
+    LOGGER.info(f'Воркер API {os.getpid()} остановлен')
 
 
 def create_web_app():
     app = FastAPI(lifespan=lifespan, docs_url='/docs')
+    app.add_middleware(MetricsMiddleware)
+    if settings.db_profile:
+        app.add_middleware(QueryProfilerMiddleware)
     app.include_router(users_routes)
     app.include_router(users_notes)
 
     return app
 
 
+def run():
+    """Запуск API: ``API_WORKERS`` процессов, uvloop и httptools.
+
+    По SIGTERM uvicorn перестаёт принимать подключения и ждёт текущие
+    запросы до ``API_GRACEFUL_TIMEOUT`` секунд. ``API_RELOAD=true`` - режим
+    разработки с перезапуском при изменении кода, только с одним воркером.
+    """
+    aggregate = prepare_multiprocess_metrics(
+        'api', settings.api_reload or settings.api_workers > 1
+    )
+    if settings.api_metrics_port:
+        start_metrics_server(settings.api_metrics_port, aggregate)
+    uvicorn.run(
+        'src.asgi:create_web_app',
+        factory=True,
+        host=settings.api_host,
+        port=settings.api_port,
+        workers=None if settings.api_reload else settings.api_workers,
+        reload=settings.api_reload,
+        loop='uvloop',
+        http='httptools',
+        timeout_graceful_shutdown=settings.api_graceful_timeout,
+    )
+
+
 if __name__ == '__main__':
-    uvicorn.run(f'{__name__}:create_web_app', host='0.0.0.0', reload=True)
+    run()
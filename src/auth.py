@@ -1,7 +1,58 @@
+import hashlib
+import time
+
+import jwt
 from fastapi import HTTPException, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jwt.exceptions import InvalidTokenError
+
+from config import LOGGER, settings
+from src.cache import TTLCache
+
+token_cache = TTLCache('jwt', settings.token_cache_size)
+# отдельный кэш: поток поддельных токенов не вытесняет действительные
+rejected_token_cache = TTLCache(
+    'jwt_rejected',
+    settings.rejected_token_cache_size,
+    ttl=settings.token_negative_ttl,
+)
+
+
+def check_token(token: str) -> dict | None:
+    """Проверяет JWT, результат проверки кэшируется по хешу токена.
+
+    Действительный токен хранится в кэше до времени из ``expires``,
+    отклонённый - ``settings.token_negative_ttl`` секунд. Для
+    недействительного, просроченного и токена без числового ``expires``
+    возвращается None.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is not None:
+        return payload
+    if rejected_token_cache.get(key):
+        return None
+
+    try:
+        decoded_token = jwt.decode(
+            token, settings.secret_key, algorithms=[settings.algorithm_hash]
+        )
+    except InvalidTokenError as e:
+        LOGGER.warning(f'Недействительный токен: {e}')
+        rejected_token_cache.set(key, True)
+        return None
+
+    expires = decoded_token.get('expires')
+    if (
+        not isinstance(expires, (int, float))
+        or isinstance(expires, bool)
+        or expires < time.time()
+    ):
+        rejected_token_cache.set(key, True)
+        return None
 
-from src.tools import check_token
+    token_cache.set(key, decoded_token, expires_at=expires)
+    return decoded_token
 
 
 class JWTBearer(HTTPBearer):
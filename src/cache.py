@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import json
+import math
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+from redis.exceptions import RedisError
+
+from config import LOGGER, settings
+from src.metrics import (
+    CACHE_COALESCED,
+    CACHE_EVICTIONS,
+    CACHE_HITS,
+    CACHE_MISSES,
+)
+
+
+class TTLCache:
+    """LRU-кэш в памяти процесса с временем жизни у каждой записи.
+
+    При переполнении вытесняется давно не читанная запись, просроченные
+    записи удаляются при обращении к ним.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._hits = CACHE_HITS.labels(name)
+        self._misses = CACHE_MISSES.labels(name)
+        self._evictions = CACHE_EVICTIONS.labels(name)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable, default=None):
+        item = self._data.get(key)
+        if item is None or item[0] <= time.time():
+            if item is not None:
+                del self._data[key]
+            self._misses.inc()
+            return default
+
+        self._data.move_to_end(key)
+        self._hits.inc()
+        return item[1]
+
+    def set(
+        self,
+        key: Hashable,
+        value,
+        ttl: float | None = None,
+        expires_at: float | None = None,
+    ):
+        """Сохраняет значение до ``expires_at`` или на ``ttl`` секунд.
+
+        Без срока и без ``ttl`` у кэша запись живёт до вытеснения.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        if expires_at is None:
+            expires_at = math.inf if ttl is None else time.time() + ttl
+
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self._evictions.inc()
+
+    def pop(self, key: Hashable, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+
+class SharedTTLCache(TTLCache):
+    """TTLCache, записи которого сбрасываются во всех процессах.
+
+    После ``start`` процесс подписан на канал Redis ``<name>:invalidate``;
+    ``invalidate`` удаляет запись у себя и публикует её ключ в JSON.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float | None = None):
+        super().__init__(name, maxsize, ttl)
+        self.channel = f'{name}:invalidate'
+        self.redis = None
+        self._listener = None
+
+    async def invalidate(self, key: Hashable):
+        self.pop(key)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.publish(self.channel, json.dumps(key))
+        except RedisError as e:
+            LOGGER.error(f'Не удалось разослать сброс {self.channel}: {e}')
+
+    async def start(self, redis):
+        self.redis = redis
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+        self.redis = None
+
+    async def _listen(self):
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self.pop(json.loads(message['data']))
+            except RedisError as e:
+                # пропущенные сообщения неизвестны, кэш сбрасывается целиком
+                LOGGER.error(f'Подписка на {self.channel} прервана: {e}')
+                self.clear()
+                await asyncio.sleep(1)
+
+
+class NotesCache:
+    """Кэш сериализованных списков заметок пользователя в Redis.
+
+    В ключ записи входит версия пользователя: любое изменение его заметок
+    увеличивает версию, поэтому старые записи больше не читаются и
+    истекают по TTL. Одновременные промахи по одному ключу в процессе
+    ждут единственную загрузку из базы, потоковые ответы сохраняются по
+    ходу выдачи. TTL 0 отключает кэш.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self.redis = None
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._hits = CACHE_HITS.labels('notes')
+        self._misses = CACHE_MISSES.labels('notes')
+        self._coalesced = CACHE_COALESCED.labels('notes')
+
+    def init(self, redis):
+        self.redis = redis
+
+    @staticmethod
+    def _version_key(user_id: int) -> str:
+        return f'notes:{user_id}:version'
+
+    async def invalidate(self, user_id: int):
+        if self.redis is None:
+            return
+        try:
+            await self.redis.incr(self._version_key(user_id))
+        except RedisError as e:
+            LOGGER.error(f'Не удалось сбросить кэш заметок {user_id}: {e}')
+
+    async def lookup(
+        self, user_id: int, variant: tuple
+    ) -> tuple[str | None, bytes | None]:
+        """Ключ записи и значение из кэша.
+
+        Ключ None, если кэш отключён или Redis недоступен: тогда ответ
+        не нужно сохранять.
+        """
+        if self.redis is None or not self.ttl:
+            return None, None
+
+        digest = hashlib.blake2b(repr(variant).encode(), digest_size=16)
+        try:
+            version = await self.redis.get(self._version_key(user_id))
+            key = f'notes:{user_id}:{int(version or 0)}:{digest.hexdigest()}'
+            cached = await self.redis.get(key)
+        except RedisError as e:
+            LOGGER.error(f'Кэш заметок недоступен: {e}')
+            return None, None
+
+        if cached is None:
+            self._misses.inc()
+        else:
+            self._hits.inc()
+        return key, cached
+
+    async def store(self, key: str, value: bytes):
+        try:
+            await self.redis.set(key, value, ex=self.ttl)
+        except RedisError as e:
+            LOGGER.error(f'Кэш заметок недоступен: {e}')
+
+    async def get_or_load(
+        self,
+        user_id: int,
+        variant: tuple,
+        loader: Callable[[], Awaitable[bytes]],
+    ) -> bytes:
+        """Значение из кэша или результат ``loader``."""
+        key, cached = await self.lookup(user_id, variant)
+        if key is None:
+            return await loader()
+        if cached is not None:
+            return cached
+
+        if key in self._inflight:
+            self._coalesced.inc()
+            future = self._inflight[key]
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # отменён загружающий запрос, а не этот
+                if not future.cancelled():
+                    raise
+                return await loader()
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # ожидающих может не быть, исключение считается полученным
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+        future.set_result(value)
+        await self.store(key, value)
+        return value
+
+
+notes_cache = NotesCache(settings.notes_cache_ttl)
+
+
+class TagCache:
+    """Соответствие названия тега его id в памяти процесса.
+
+    Теги не переименовываются и не удаляются, поэтому записи не нужно
+    сбрасывать: id по названию не меняется.
+    """
+
+    def __init__(self, maxsize: int):
+        self._ids = TTLCache('tags', maxsize)
+
+    def get_many(self, titles: list[str]) -> tuple[dict[str, int], list]:
+        found, missing = {}, []
+        for title in titles:
+            tag_id = self._ids.get(title)
+            if tag_id is None:
+                missing.append(title)
+            else:
+                found[title] = tag_id
+
+        return found, missing
+
+    def update(self, ids: dict[str, int]):
+        for title, tag_id in ids.items():
+            self._ids.set(sys.intern(title), tag_id)
+
+
+tag_cache = TagCache(settings.tag_cache_size)
+telegram_user_cache = SharedTTLCache(
+    'telegram_users',
+    settings.telegram_user_cache_size,
+    settings.telegram_user_cache_ttl,
+)
+notes_page_cache = TTLCache(
+    'bot_note_pages',
+    settings.bot_page_cache_size,
+    settings.bot_page_cache_ttl,
+)
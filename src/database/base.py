@@ -1,19 +1,88 @@
+import time
+from contextlib import asynccontextmanager
 from typing import AsyncGenerator
 
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from config import settings
+from src.database.profiler import record_statement
+from src.metrics import (
+    DB_POOL_TIMEOUTS,
+    DB_POOL_WAIT,
+    observe_pool,
+    record_query,
+)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, замеряющий ожидание свободного подключения."""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except TimeoutError:
+            DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - started)
+
 
 engine = create_async_engine(
     settings.db_url,
-    pool_timeout=60,
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    connect_args={
+        'statement_cache_size': settings.db_statement_cache_size,
+        'prepared_statement_cache_size': settings.db_statement_cache_size,
+    },
 )
 
+
+@event.listens_for(engine.sync_engine, 'checkout')
+def pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    observe_pool(engine.sync_engine.pool)
+
+
+@event.listens_for(engine.sync_engine, 'checkin')
+def pool_checkin(dbapi_connection, connection_record):
+    observe_pool(engine.sync_engine.pool, returning=1)
+
+
+@event.listens_for(engine.sync_engine, 'before_cursor_execute')
+def query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(engine.sync_engine, 'after_cursor_execute')
+def query_finished(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    record_query(elapsed)
+    if settings.db_profile:
+        record_statement(statement, parameters, executemany, elapsed)
+
+
+@event.listens_for(engine.sync_engine, 'handle_error')
+def query_failed(context):
+    # after_cursor_execute для упавшего запроса не вызывается
+    if context.connection is not None:
+        started = context.connection.info.get('query_started')
+        if started:
+            started.pop()
+
+
 async_session_factory = async_sessionmaker(
     engine,
     expire_on_commit=False,
@@ -25,5 +94,24 @@ class Base(DeclarativeBase):
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    """Сессия на запрос: одно подключение и одна транзакция.
+
+    Фиксирует транзакцию обработчик запроса, при выходе без commit
+    изменения откатываются.
+    """
+    async with async_session_factory() as session:
+        yield session
+
+
+@asynccontextmanager
+async def session_scope(
+    session: AsyncSession | None = None,
+) -> AsyncGenerator[AsyncSession, None]:
+    """Переданная сессия вызывающего кода или новая со своим commit."""
+    if session is not None:
+        yield session
+        return
+
     async with async_session_factory() as session:
         yield session
+        await session.commit()
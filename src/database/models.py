@@ -2,30 +2,53 @@ import time
 from datetime import datetime
 
 import jwt
-from passlib.context import CryptContext
 from sqlalchemy import (
     BigInteger,
     Boolean,
     Column,
+    Computed,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     String,
     Table,
     Text,
     and_,
+    bindparam,
+    cast,
     delete,
     desc,
     func,
     select,
+    tuple_,
+    update,
 )
+from sqlalchemy.dialects.postgresql import REGCONFIG, TSVECTOR, insert
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Mapped, mapped_column, relationship, selectinload
 
 from config import LOGGER, settings
-from src.database.base import Base, async_session_factory
+from src.cache import tag_cache, telegram_user_cache
+from src.database.base import Base, async_session_factory, session_scope
+from src.passwords import hash_password, verify_password
+
+NOTE_FIELDS = (
+    'id',
+    'user_id',
+    'title',
+    'text',
+    'tags',
+    'created_at',
+    'updated_at',
+)
+# нужны для курсора, поэтому выбираются, даже если их не запросили
+NOTE_CURSOR_FIELDS = ('id', 'created_at')
 
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+# russian-конфигурация стеммит кириллицу, а латиницу отдаёт english_stem
+FTS_CONFIG = 'russian'
+FTS_HEADLINE_OPTIONS = 'MaxFragments=2, MinWords=5, MaxWords=20'
 
 
 notes_tags_table = Table(
@@ -38,6 +61,11 @@ notes_tags_table = Table(
         primary_key=True,
     ),
     Column('tags_id', Integer, ForeignKey('tags.id'), primary_key=True),
+    Index(
+        'ix_notes_tags_table_association_tags_id_notes_id',
+        'tags_id',
+        'notes_id',
+    ),
 )
 
 
@@ -60,51 +88,70 @@ class User(Base):
     notes: Mapped['Note'] = relationship('Note', back_populates='user')
 
     @classmethod
-    async def add_user(cls, username: str, password: str):
-        hash_password = pwd_context.hash(password)
+    async def add_user(
+        cls, username: str, password: str, session: AsyncSession = None
+    ):
+        password_hash = await hash_password(password)
 
-        async with async_session_factory() as session:
+        async with session_scope(session) as session:
             new_user = cls(
                 username=username,
-                password=hash_password,
+                password=password_hash,
             )
-            session.add(new_user)
-            await session.flush()
-
-            token = await cls.__generate_jwt_token(new_user.id)
-            new_user.token = token
-
             try:
-                await session.commit()
-                return new_user
+                async with session.begin_nested():
+                    session.add(new_user)
+                    await session.flush()
             except IntegrityError as e:
                 LOGGER.exception(e)
-                await session.rollback()
                 return None
 
+            token = await cls.__generate_jwt_token(new_user.id)
+            new_user.token = token
+            await session.flush()
+
+            return new_user
+
     @classmethod
-    async def get_user(cls, username: str, password: str):
-        async with async_session_factory() as session:
-            user = await session.scalar(
-                select(cls).where(and_(cls.username == username))
+    async def _check_password(
+        cls, username: str, password: str, session: AsyncSession
+    ) -> int | None:
+        """id пользователя, если пароль верный.
+
+        Транзакция чтения завершается до проверки пароля: пока запрос ждёт
+        пул хеширования и bcrypt, подключение к базе свободно. Поэтому в
+        переданной сессии не должно быть незафиксированных изменений.
+        """
+        row = (
+            await session.execute(
+                select(cls.id, cls.password).where(cls.username == username)
             )
-            check_password = pwd_context.verify(password, user.password)
+        ).first()
+        await session.rollback()
 
-            if user and check_password:
-                return user
+        if row and await verify_password(password, row.password):
+            return row.id
 
     @classmethod
-    async def new_jwt_token(cls, username: str, password: str):
-        async with async_session_factory() as session:
-            user = await session.scalar(
-                select(cls).where(and_(cls.username == username))
-            )
-            check_password = pwd_context.verify(password, user.password)
+    async def get_user(
+        cls, username: str, password: str, session: AsyncSession = None
+    ):
+        async with session_scope(session) as session:
+            user_id = await cls._check_password(username, password, session)
+            if user_id:
+                return await session.get(cls, user_id)
 
-            if user and check_password:
-                token = await cls.__generate_jwt_token(user.id)
-                user.token = token
-                await session.commit()
+    @classmethod
+    async def new_jwt_token(
+        cls, username: str, password: str, session: AsyncSession = None
+    ):
+        async with session_scope(session) as session:
+            user_id = await cls._check_password(username, password, session)
+            if user_id:
+                token = await cls.__generate_jwt_token(user_id)
+                await session.execute(
+                    update(cls).where(cls.id == user_id).values(token=token)
+                )
 
                 return token
 
@@ -139,76 +186,345 @@ class Note(Base):
     )
     user: Mapped['User'] = relationship('User', back_populates='notes')
 
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            f"setweight(to_tsvector('{FTS_CONFIG}', coalesce(title, '')), 'A')"
+            f" || setweight(to_tsvector('{FTS_CONFIG}', coalesce(text, '')),"
+            " 'B')",
+            persisted=True,
+        ),
+        deferred=True,
+    )
+
     @classmethod
-    async def get_all_notes(cls, user_id: int):
+    def _user_notes_query(
+        cls,
+        user_id: int,
+        columns: list,
+        cursor: tuple[datetime, int] | None = None,
+        tag_ids: list[int] | None = None,
+        match_all: bool = False,
+    ):
+        query = (
+            select(*columns)
+            .where(cls.user_id == user_id)
+            .order_by(desc(cls.created_at), desc(cls.id))
+        )
+        if cursor:
+            query = query.where(
+                tuple_(cls.created_at, cls.id) < tuple_(*cursor)
+            )
+        if tag_ids:
+            # подзапрос связан с заметкой: связи тегов читаются только для
+            # заметок пользователя, а не для всех заметок с этими тегами
+            tagged = select(notes_tags_table.c.notes_id).where(
+                notes_tags_table.c.notes_id == cls.id,
+                notes_tags_table.c.tags_id.in_(tag_ids),
+            )
+            if match_all:
+                matched = tagged.with_only_columns(func.count())
+                query = query.where(
+                    matched.scalar_subquery() == len(set(tag_ids))
+                )
+            else:
+                query = query.where(tagged.exists())
+
+        return query
+
+    @classmethod
+    def _row_columns(cls, fields: tuple[str, ...]):
+        names = [
+            name
+            for name in NOTE_FIELDS
+            if name != 'tags'
+            and (name in fields or name in NOTE_CURSOR_FIELDS)
+        ]
+        return names, [getattr(cls, name) for name in names]
+
+    @staticmethod
+    async def _rows_with_tags(
+        names: list[str],
+        rows: list[tuple],
+        fields: tuple[str, ...],
+        session: AsyncSession,
+    ) -> list[dict]:
+        notes = [dict(zip(names, row)) for row in rows]
+        if 'tags' in fields and notes:
+            tags = {note['id']: [] for note in notes}
+            for note_id, tag_id, title in await session.execute(
+                select(notes_tags_table.c.notes_id, Tag.id, Tag.title)
+                .join(Tag, Tag.id == notes_tags_table.c.tags_id)
+                .where(notes_tags_table.c.notes_id.in_(tags))
+                .order_by(notes_tags_table.c.notes_id, Tag.id)
+            ):
+                tags[note_id].append({'id': tag_id, 'title': title})
+            for note in notes:
+                note['tags'] = tags[note['id']]
+
+        return notes
+
+    @classmethod
+    async def get_note_rows(
+        cls,
+        user_id: int,
+        limit: int,
+        fields: tuple[str, ...],
+        cursor: tuple[datetime, int] | None = None,
+        tag_ids: list[int] | None = None,
+        match_all: bool = False,
+        session: AsyncSession = None,
+    ) -> list[dict]:
+        """Страница заметок словарями без ORM-объектов.
+
+        Колонки выбираются по ``fields``, теги - вторым запросом по id
+        заметок страницы. Всегда есть ключи id и created_at.
+        """
+        names, columns = cls._row_columns(fields)
+        query = cls._user_notes_query(
+            user_id, columns, cursor, tag_ids, match_all
+        )
+        async with session_scope(session) as session:
+            rows = (await session.execute(query.limit(limit))).all()
+            return await cls._rows_with_tags(names, rows, fields, session)
+
+    @classmethod
+    async def stream_note_rows(
+        cls,
+        user_id: int,
+        fields: tuple[str, ...],
+        cursor: tuple[datetime, int] | None = None,
+        tag_ids: list[int] | None = None,
+        match_all: bool = False,
+        chunk_size: int = 500,
+    ):
+        """Все заметки словарями, по списку на каждые ``chunk_size``."""
+        names, columns = cls._row_columns(fields)
+        query = cls._user_notes_query(
+            user_id, columns, cursor, tag_ids, match_all
+        )
         async with async_session_factory() as session:
-            notes = (
-                (
-                    await session.execute(
-                        select(cls)
-                        .where(cls.user_id.in_([user_id]))
-                        .options(selectinload(cls.tags))
-                        .order_by(desc(cls.created_at))
-                    )
+            result = await session.stream(
+                query.execution_options(yield_per=chunk_size)
+            )
+            async for partition in result.partitions():
+                yield await cls._rows_with_tags(
+                    names, partition, fields, session
                 )
-                .scalars()
-                .all()
+
+    @classmethod
+    async def full_text_search(
+        cls,
+        user_id: int,
+        search_query: str,
+        limit: int,
+        cursor: tuple[float, int] | None = None,
+        session: AsyncSession = None,
+    ):
+        ts_query = func.websearch_to_tsquery(
+            cast(FTS_CONFIG, REGCONFIG), search_query
+        )
+        rank = func.ts_rank_cd(cls.search_vector, ts_query)
+        hits = (
+            select(
+                cls.id,
+                cls.title,
+                cls.text,
+                cls.created_at,
+                rank.label('rank'),
             )
-            return notes
+            .where(cls.user_id == user_id)
+            .where(cls.search_vector.bool_op('@@')(ts_query))
+            .order_by(desc(rank), desc(cls.id))
+            .limit(limit)
+        )
+        if cursor:
+            hits = hits.where(tuple_(rank, cls.id) < tuple_(*cursor))
+        hits = hits.subquery()
+
+        # подсветка строится только для отобранной страницы
+        query = select(
+            hits.c.id,
+            hits.c.title,
+            hits.c.created_at,
+            hits.c.rank,
+            func.ts_headline(
+                cast(FTS_CONFIG, REGCONFIG),
+                hits.c.text,
+                ts_query,
+                FTS_HEADLINE_OPTIONS,
+            ).label('snippet'),
+        ).order_by(desc(hits.c.rank), desc(hits.c.id))
+
+        async with session_scope(session) as session:
+            return (await session.execute(query)).all()
 
     @classmethod
     async def create_note(
-        cls, user_id: int, title: str, text: str, tags: list['Tag']
+        cls,
+        user_id: int,
+        title: str,
+        text: str,
+        tag_ids: list[int],
+        session: AsyncSession = None,
     ):
-        async with async_session_factory() as session:
-            note = cls(title=title, text=text, user_id=user_id, tags=tags)
+        async with session_scope(session) as session:
+            note = cls(title=title, text=text, user_id=user_id)
             session.add(note)
-            try:
-                await session.commit()
-                return note
-            except IntegrityError as e:
-                LOGGER.exception(e)
-                await session.rollback()
-                return None
+            await session.flush()
+            await cls._insert_notes_tags({note.id: tag_ids}, session)
+
+            return note
 
     @classmethod
-    async def get_note(cls, id_: int):
-        async with async_session_factory() as session:
+    async def get_user_note(
+        cls, id_: int, user_id: int, session: AsyncSession = None
+    ):
+        async with session_scope(session) as session:
             note = await session.scalar(
                 select(cls)
-                .where(cls.id.in_([id_]))
+                .where(cls.id == id_, cls.user_id == user_id)
                 .options(selectinload(cls.tags))
             )
             return note
 
     @classmethod
-    async def delete_note(cls, id_: int):
-        async with async_session_factory() as session:
-            await session.execute(delete(cls).where(cls.id.in_([id_])))
-            await session.commit()
+    async def delete_note(
+        cls, id_: int, user_id: int, session: AsyncSession = None
+    ):
+        user_note = select(cls.id).where(cls.id == id_, cls.user_id == user_id)
+        async with session_scope(session) as session:
+            await session.execute(
+                delete(notes_tags_table).where(
+                    notes_tags_table.c.notes_id.in_(user_note)
+                )
+            )
+            deleted = await session.execute(
+                delete(cls).where(cls.id.in_(user_note))
+            )
+
+            return bool(deleted.rowcount)
 
     @classmethod
-    async def edit_note(cls, id_: int, text: str):
-        async with async_session_factory() as session:
-            note = await cls.get_note(id_)
+    async def edit_note(
+        cls, id_: int, text: str, session: AsyncSession = None
+    ):
+        async with session_scope(session) as session:
+            note = await session.get(cls, id_)
             note.text = text
+            await session.flush()
 
-            session.add(note)
-            await session.commit()
+    @classmethod
+    async def edit_tags_note(
+        cls, id_: int, tags: list, session: AsyncSession = None
+    ):
+        async with session_scope(session) as session:
+            tag_ids = await Tag.resolve_ids(tags, session)
+            await cls.set_notes_tags({id_: list(tag_ids.values())}, session)
 
     @classmethod
-    async def edit_tags_note(cls, id_: int, tags: list):
-        async with async_session_factory() as session:
-            note = await cls.get_note(id_)
-            tags = await Tag.get_tags_by_title(tags)
-            note.tags = tags
+    async def get_user_note_ids(
+        cls, ids: list[int], user_id: int, session: AsyncSession = None
+    ):
+        async with session_scope(session) as session:
+            owned = await session.scalars(
+                select(cls.id).where(cls.id.in_(ids), cls.user_id == user_id)
+            )
+            return set(owned)
 
-            session.add(note)
-            await session.commit()
+    @classmethod
+    async def create_notes(
+        cls, user_id: int, notes: list[dict], session: AsyncSession = None
+    ):
+        """Массовая вставка заметок с уже известными id тегов.
+
+        ``notes`` - словари с ключами title, text и tag_ids. Возвращает id
+        созданных заметок в порядке ``notes``.
+        """
+        async with session_scope(session) as session:
+            ids = (
+                await session.scalars(
+                    insert(cls).returning(
+                        cls.id, sort_by_parameter_order=True
+                    ),
+                    [
+                        {
+                            'title': note['title'],
+                            'text': note['text'],
+                            'user_id': user_id,
+                        }
+                        for note in notes
+                    ],
+                )
+            ).all()
+            await cls._insert_notes_tags(
+                dict(zip(ids, (note['tag_ids'] for note in notes))), session
+            )
+
+            return ids
+
+    @classmethod
+    async def edit_notes(
+        cls, texts: dict[int, str], session: AsyncSession = None
+    ):
+        async with session_scope(session) as session:
+            await session.execute(
+                update(cls.__table__)
+                .where(cls.__table__.c.id == bindparam('note_id'))
+                .values(text=bindparam('note_text')),
+                [
+                    {'note_id': id_, 'note_text': text}
+                    for id_, text in texts.items()
+                ],
+            )
+
+    @classmethod
+    async def set_notes_tags(
+        cls, tag_ids: dict[int, list[int]], session: AsyncSession = None
+    ):
+        async with session_scope(session) as session:
+            await session.execute(
+                delete(notes_tags_table).where(
+                    notes_tags_table.c.notes_id.in_(tag_ids)
+                )
+            )
+            await cls._insert_notes_tags(tag_ids, session)
+
+    @classmethod
+    async def delete_notes(cls, ids: list[int], session: AsyncSession = None):
+        async with session_scope(session) as session:
+            await session.execute(
+                delete(notes_tags_table).where(
+                    notes_tags_table.c.notes_id.in_(ids)
+                )
+            )
+            await session.execute(delete(cls).where(cls.id.in_(ids)))
+
+    @staticmethod
+    async def _insert_notes_tags(
+        tag_ids: dict[int, list[int]], session: AsyncSession
+    ):
+        rows = [
+            {'notes_id': note_id, 'tags_id': tag_id}
+            for note_id, ids in tag_ids.items()
+            for tag_id in dict.fromkeys(ids)
+        ]
+        if rows:
+            await session.execute(insert(notes_tags_table), rows)
+
+
+Index(
+    'ix_notes_user_id_created_at_id',
+    Note.user_id,
+    Note.created_at.desc(),
+    Note.id.desc(),
+)
+Index('ix_notes_search_vector', Note.search_vector, postgresql_using='gin')
 
 
 class Tag(Base):
     __tablename__ = 'tags'
+    __table_args__ = (Index('ix_tags_title', 'title', unique=True),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     title: Mapped[[str]] = mapped_column(String(255), nullable=False)
@@ -222,43 +538,73 @@ class Tag(Base):
         back_populates='tags',
     )
 
+    @staticmethod
+    async def _title_ids(titles: list, session: AsyncSession):
+        rows = await session.execute(
+            select(Tag.title, Tag.id).where(Tag.title.in_(titles))
+        )
+        return dict(rows.all())
+
     @classmethod
-    async def get_tags_by_title(cls, title_list: list):
-        async with async_session_factory() as session:
-            tags = (
-                (
-                    await session.execute(
-                        select(cls).where(cls.title.in_(title_list))
-                    )
-                )
-                .scalars()
-                .all()
-            )
-            if not tags or len(tags) != len(title_list):
-                tags = await cls.create_tags(title_list)
+    async def get_ids_by_title(
+        cls, title_list: list, session: AsyncSession = None
+    ):
+        ids, missing = tag_cache.get_many(list(dict.fromkeys(title_list)))
+        if missing:
+            async with session_scope(session) as session:
+                found = await cls._title_ids(missing, session)
+            tag_cache.update(found)
+            ids.update(found)
 
-            return tags
+        return list(ids.values())
 
     @classmethod
-    async def create_tag(cls, title: str):
-        async with async_session_factory() as session:
-            tag = cls(title=title)
-            session.add(tag)
-            await session.commit()
-            return tag
+    async def resolve_ids(
+        cls, title_list: list, session: AsyncSession = None
+    ) -> dict[str, int]:
+        """id тегов по названиям, недостающие теги создаются.
+
+        Известные процессу теги берутся из ``tag_cache`` без запросов.
+        Созданные в этой транзакции теги в кэш не попадают: транзакция
+        ещё может откатиться.
+        """
+        titles = list(dict.fromkeys(title_list))
+        ids, missing = tag_cache.get_many(titles)
+        if not missing:
+            return ids
+
+        async with session_scope(session) as session:
+            existing = await cls._title_ids(missing, session)
+            tag_cache.update(existing)
+            ids.update(existing)
+
+            # одинаковый порядок вставки: параллельные транзакции с
+            # пересекающимися тегами не блокируют друг друга по ix_tags_title
+            new = sorted(title for title in missing if title not in existing)
+            if new:
+                inserted = await session.execute(
+                    insert(cls)
+                    .values([{'title': title} for title in new])
+                    .on_conflict_do_nothing(index_elements=[cls.title])
+                    .returning(cls.title, cls.id)
+                )
+                ids.update(inserted.all())
 
-    @classmethod
-    async def create_tags(cls, title_list: list):
-        list_tags = []
-        async with async_session_factory() as session:
-            for title in title_list:
-                tag = cls(title=title)
-                session.add(tag)
-                await session.flush()
-                list_tags.append(tag)
-            await session.commit()
+                # теги, которые успела вставить параллельная транзакция
+                raced = [title for title in new if title not in ids]
+                if raced:
+                    ids.update(await cls._title_ids(raced, session))
+
+        return {title: ids[title] for title in titles}
 
-        return list_tags
+    @classmethod
+    async def get_title_ids(cls, limit: int, session: AsyncSession = None):
+        """Последние созданные теги для прогрева ``tag_cache``."""
+        async with session_scope(session) as session:
+            rows = await session.execute(
+                select(cls.title, cls.id).order_by(cls.id.desc()).limit(limit)
+            )
+            return dict(rows.all())
 
 
 class TelegramUser(Base):
@@ -277,49 +623,64 @@ class TelegramUser(Base):
     )
 
     @classmethod
-    async def create_user(cls, telegram_id: int):
-        async with async_session_factory() as session:
+    async def create_user(cls, telegram_id: int, session: AsyncSession = None):
+        async with session_scope(session) as session:
             new_user = cls(telegram_id=telegram_id)
-            session.add(new_user)
             try:
-                await session.commit()
-                return new_user
+                async with session.begin_nested():
+                    session.add(new_user)
+                    await session.flush()
             except IntegrityError as e:
                 LOGGER.exception(e)
-                await session.rollback()
                 return None
 
-    @classmethod
-    async def check_user(cls, telegram_id: int):
-        async with async_session_factory() as session:
-            user = await session.scalar(
-                select(cls).where(cls.telegram_id.in_([telegram_id]))
-            )
+        telegram_user_cache.set(telegram_id, new_user)
+        return new_user
 
+    @classmethod
+    async def check_user(cls, telegram_id: int, session: AsyncSession = None):
+        """Пользователь из ``telegram_user_cache`` или из базы."""
+        user = telegram_user_cache.get(telegram_id)
+        if user is not None:
             return user
 
-    @classmethod
-    async def new_jwt_token(cls, telegram_id: int, token: str):
-        async with async_session_factory() as session:
+        async with session_scope(session) as session:
             user = await session.scalar(
                 select(cls).where(cls.telegram_id == telegram_id)
             )
 
-            if user:
-                user.token = token
-                await session.commit()
-
-                return token
+        if user:
+            telegram_user_cache.set(telegram_id, user)
+        return user
 
     @classmethod
-    async def delete_token(cls, telegram_id: int):
-        async with async_session_factory() as session:
-            user = await session.scalar(
-                select(cls).where(cls.telegram_id == telegram_id)
+    async def new_jwt_token(
+        cls, telegram_id: int, token: str, session: AsyncSession = None
+    ):
+        async with session_scope(session) as session:
+            updated = await session.scalar(
+                update(cls)
+                .where(cls.telegram_id == telegram_id)
+                .values(token=token)
+                .returning(cls.id)
             )
 
-            if user:
-                user.token = None
-                await session.commit()
+        await telegram_user_cache.invalidate(telegram_id)
+        if updated:
+            return token
+
+    @classmethod
+    async def delete_token(
+        cls, telegram_id: int, session: AsyncSession = None
+    ):
+        async with session_scope(session) as session:
+            updated = await session.scalar(
+                update(cls)
+                .where(cls.telegram_id == telegram_id)
+                .values(token=None)
+                .returning(cls.id)
+            )
 
-                return True
+        await telegram_user_cache.invalidate(telegram_id)
+        if updated:
+            return True
@@ -0,0 +1,113 @@
+"""Профилирование запросов к базе, включается ``DB_PROFILE=true``.
+
+Хуки движка из ``src.database.base`` передают сюда каждый выполненный
+запрос. Медленные запросы пишутся в лог сразу, остальные копятся в
+профиле текущего запроса к API: по завершении запроса в лог попадают
+повторы одного и того же запроса (признак N+1), а в ответ - заголовки
+``X-Query-Count`` и ``X-Query-Time``.
+"""
+import re
+from collections import Counter
+from contextvars import ContextVar
+
+from config import LOGGER, settings
+
+# списки параметров IN (...) разной длины считаются одним запросом
+PLACEHOLDERS = re.compile(r'\(\$\d+(?:::[\w ]+)?(?:, \$\d+(?:::[\w ]+)?)*\)')
+SPACES = re.compile(r'\s+')
+STATEMENT_LOG_LIMIT = 500
+
+request_profile: ContextVar[list | None] = ContextVar(
+    'request_profile', default=None
+)
+
+
+def statement_shape(statement: str) -> str:
+    return PLACEHOLDERS.sub('(...)', SPACES.sub(' ', statement).strip())
+
+
+def parameters_shape(parameters, executemany: bool) -> str:
+    """Типы параметров без значений: ``(int, str)`` или ``3 x (int)``."""
+    if executemany:
+        rows = list(parameters)
+        if not rows:
+            return '0 x ()'
+        return f'{len(rows)} x {parameters_shape(rows[0], False)}'
+    if isinstance(parameters, dict):
+        parameters = parameters.values()
+    return '(' + ', '.join(type(p).__name__ for p in parameters or ()) + ')'
+
+
+def shorten(statement: str) -> str:
+    if len(statement) <= STATEMENT_LOG_LIMIT:
+        return statement
+    return statement[:STATEMENT_LOG_LIMIT] + '…'
+
+
+def record_statement(statement, parameters, executemany, seconds: float):
+    shape = statement_shape(statement)
+    params = parameters_shape(parameters, executemany)
+    if seconds * 1000 >= settings.db_slow_query_ms:
+        LOGGER.warning(
+            f'Медленный запрос {seconds * 1000:.1f} мс: '
+            f'{shorten(shape)} {params}'
+        )
+
+    profile = request_profile.get()
+    if profile is not None:
+        profile.append((shape, params, seconds))
+
+
+def report(method: str, path: str, profile: list):
+    total = sum(seconds for *_, seconds in profile)
+    LOGGER.debug(
+        f'{method} {path}: {len(profile)} запросов к базе, '
+        f'{total * 1000:.1f} мс'
+    )
+    for shape, params, seconds in profile:
+        LOGGER.debug(f'  {seconds * 1000:.1f} мс {shorten(shape)} {params}')
+
+    repeats = Counter(shape for shape, *_ in profile)
+    for shape, count in repeats.items():
+        if count >= settings.db_repeat_threshold:
+            LOGGER.warning(
+                f'Возможный N+1 в {method} {path}: запрос выполнен '
+                f'{count} раз: {shorten(shape)}'
+            )
+
+
+class QueryProfilerMiddleware:
+    """ASGI-middleware, собирающее профиль запросов к базе.
+
+    Заголовки ставятся при начале ответа, поэтому запросы к базе во время
+    потоковой выдачи в них не учтены, но попадают в лог.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        profile = []
+        token = request_profile.set(profile)
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                total = sum(seconds for *_, seconds in profile)
+                message['headers'] = [
+                    *message.get('headers', []),
+                    (b'x-query-count', str(len(profile)).encode()),
+                    (b'x-query-time', f'{total * 1000:.1f}'.encode()),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_profile.reset(token)
+            route = scope.get('route')
+            path = route.path if route is not None else scope['path']
+            report(scope['method'], path, profile)
@@ -0,0 +1,279 @@
+"""Выгрузка и загрузка заметок пользователя через COPY.
+
+Форматы: NDJSON (по объекту на строку) и CSV с заголовком. Оба содержат
+title, text, created_at, updated_at и tags - список названий тегов,
+в CSV он записан JSON-массивом. Поток может быть сжат gzip.
+"""
+import asyncio
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator
+
+from sqlalchemy import text
+
+from src.database.base import async_session_factory, session_scope
+
+FORMATS = ('ndjson', 'csv')
+COPY_BATCH_QUEUE = 16
+INFLATE_CHUNK_SIZE = 256 * 1024
+CSV_UNFINISHED = 'unexpected end of data'
+
+NOTES_QUERY = """
+    SELECT n.title, n.text, n.created_at, n.updated_at,
+           coalesce(
+               (SELECT json_agg(t.title ORDER BY t.title)
+                FROM notes_tags_table_association AS a
+                JOIN tags AS t ON t.id = a.tags_id
+                WHERE a.notes_id = n.id),
+               '[]'
+           ) AS tags
+    FROM notes AS n
+    WHERE n.user_id = $1
+    ORDER BY n.created_at, n.id
+"""
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+async def _driver_connection(session):
+    connection = await session.connection()
+    raw = await connection.get_raw_connection()
+    return raw.driver_connection
+
+
+async def export_notes(
+    user_id: int, fmt: str = 'ndjson', compress: bool = False
+) -> AsyncIterator[bytes]:
+    """Поток заметок пользователя из ``COPY ... TO STDOUT``.
+
+    COPY пишет в ограниченную очередь, поэтому медленный клиент
+    притормаживает выгрузку, а не копит её в памяти.
+    """
+    if fmt == 'ndjson':
+        query = f'SELECT row_to_json(notes) FROM ({NOTES_QUERY}) AS notes'
+        # csv-кавычка и разделитель, которых не бывает в выводе row_to_json:
+        # строки JSON уходят клиенту без экранирования
+        options = {'format': 'csv', 'quote': '\x01', 'delimiter': '\x02'}
+    else:
+        query = NOTES_QUERY
+        options = {'format': 'csv', 'header': True}
+
+    queue = asyncio.Queue(maxsize=COPY_BATCH_QUEUE)
+
+    async def copy():
+        cancelled = False
+        try:
+            async with async_session_factory() as session:
+                conn = await _driver_connection(session)
+                await conn.copy_from_query(
+                    query, user_id, output=queue.put, **options
+                )
+        except asyncio.CancelledError:
+            # клиент отключился: очередь никто не читает, место в ней
+            # не освободится
+            cancelled = True
+            raise
+        finally:
+            if not cancelled:
+                await queue.put(None)
+
+    task = asyncio.create_task(copy())
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    try:
+        while (chunk := await queue.get()) is not None:
+            chunk = bytes(chunk)
+            if compressor:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+        if compressor:
+            yield compressor.flush()
+        await task
+    finally:
+        task.cancel()
+
+
+def _inflate(decompressor, chunk: bytes):
+    # ограничение на выход не даёт сжатому куску развернуться целиком
+    while chunk:
+        yield decompressor.decompress(chunk, INFLATE_CHUNK_SIZE)
+        chunk = decompressor.unconsumed_tail
+
+
+async def _lines(chunks: AsyncIterator[bytes], compressed: bool):
+    decompressor = zlib.decompressobj(wbits=47) if compressed else None
+    buffer = b''
+    async for chunk in chunks:
+        parts = _inflate(decompressor, chunk) if decompressor else (chunk,)
+        for part in parts:
+            buffer += part
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                yield line.decode()
+    if decompressor:
+        buffer += decompressor.flush()
+    if buffer:
+        yield buffer.decode()
+
+
+async def _ndjson_rows(lines):
+    async for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _parse_csv_record(record: str) -> list[str] | None:
+    """Поля записи или None, если запись оборвана внутри кавычек."""
+    try:
+        return next(csv.reader(io.StringIO(record), strict=True), [])
+    except csv.Error as e:
+        # перевод строки внутри кавычек - продолжение того же поля
+        if str(e) == CSV_UNFINISHED:
+            return None
+        raise
+
+
+async def _csv_rows(lines):
+    header = None
+    record = ''
+    async for line in lines:
+        record += line + '\n'
+        values = _parse_csv_record(record)
+        if values is None:
+            continue
+        record = ''
+        if not values:
+            continue
+        if header is None:
+            header = values
+            continue
+        row = dict(zip(header, values))
+        row['tags'] = json.loads(row.get('tags') or '[]')
+        yield row
+    if record:
+        raise ImportFormatError('Незакрытая кавычка в последней записи CSV')
+
+
+def _timestamp(value):
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+async def _records(rows):
+    seq = 0
+    async for row in rows:
+        seq += 1
+        try:
+            title = row['title']
+            tags = [str(tag) for tag in row.get('tags') or []]
+            if not isinstance(title, str) or len(title) > 255:
+                raise ValueError('title')
+            yield (
+                seq,
+                title,
+                str(row['text']),
+                _timestamp(row.get('created_at')),
+                _timestamp(row.get('updated_at')),
+                tags,
+            )
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise ImportFormatError(f'Запись {seq}: {e}') from e
+
+
+async def import_notes(
+    user_id: int,
+    chunks: AsyncIterator[bytes],
+    fmt: str = 'ndjson',
+    compressed: bool = False,
+    session=None,
+) -> int:
+    """Загружает заметки в одной транзакции через промежуточную таблицу.
+
+    Записи потоком уходят в ``copy_records_to_table``, затем теги, заметки
+    и связи переносятся тремя INSERT ... SELECT.
+    """
+    lines = _lines(chunks, compressed)
+    rows = _ndjson_rows(lines) if fmt == 'ndjson' else _csv_rows(lines)
+
+    async with session_scope(session) as session:
+        await session.execute(
+            text(
+                """
+                CREATE TEMP TABLE import_notes (
+                    seq bigint,
+                    note_id integer DEFAULT
+                        nextval(pg_get_serial_sequence('notes', 'id')),
+                    title varchar(255),
+                    text text,
+                    created_at timestamp,
+                    updated_at timestamp,
+                    tags varchar(255)[]
+                ) ON COMMIT DROP
+                """
+            )
+        )
+        conn = await _driver_connection(session)
+        try:
+            await conn.copy_records_to_table(
+                'import_notes',
+                records=_records(rows),
+                columns=[
+                    'seq',
+                    'title',
+                    'text',
+                    'created_at',
+                    'updated_at',
+                    'tags',
+                ],
+            )
+        except (UnicodeDecodeError, ValueError, csv.Error, zlib.error) as e:
+            raise ImportFormatError(str(e)) from e
+        await session.execute(text('ANALYZE import_notes'))
+
+        await session.execute(
+            text(
+                """
+                INSERT INTO tags (title, created_at, updated_at)
+                SELECT title, now(), now()
+                FROM (SELECT DISTINCT unnest(tags) AS title
+                      FROM import_notes) AS new_tags
+                ORDER BY title
+                ON CONFLICT (title) DO NOTHING
+                """
+            )
+        )
+        imported = await session.execute(
+            text(
+                """
+                INSERT INTO notes (id, title, text, user_id, created_at,
+                                   updated_at)
+                SELECT note_id, title, text, :user_id,
+                       coalesce(created_at, now()),
+                       coalesce(updated_at, created_at, now())
+                FROM import_notes
+                ORDER BY seq
+                """
+            ),
+            {'user_id': user_id},
+        )
+        await session.execute(
+            text(
+                """
+                INSERT INTO notes_tags_table_association (notes_id, tags_id)
+                SELECT DISTINCT i.note_id, t.id
+                FROM import_notes AS i
+                CROSS JOIN LATERAL unnest(i.tags) AS u(title)
+                JOIN tags AS t ON t.title = u.title
+                """
+            )
+        )
+
+        return imported.rowcount
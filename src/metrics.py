@@ -0,0 +1,220 @@
+import os
+import shutil
+import time
+from contextvars import ContextVar
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    multiprocess,
+    start_http_server,
+)
+from starlette.routing import Match
+
+from config import LOGGER
+
+MULTIPROC_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+if os.getenv(MULTIPROC_DIR_ENV):
+    # файлы метрик создаются уже при их объявлении ниже
+    os.makedirs(os.environ[MULTIPROC_DIR_ENV], exist_ok=True)
+
+DB_POOL_WAIT = Histogram(
+    'db_pool_checkout_seconds',
+    'Время получения подключения из пула',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+DB_POOL_TIMEOUTS = Counter(
+    'db_pool_timeouts_total', 'Отказы в подключении по pool_timeout'
+)
+# состояние пулов, суммированное по живым воркерам
+DB_POOL_SIZE = Gauge(
+    'db_pool_size', 'Размер пула', multiprocess_mode='livesum'
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    'db_pool_checked_out', 'Выданные подключения', multiprocess_mode='livesum'
+)
+DB_POOL_CHECKED_IN = Gauge(
+    'db_pool_checked_in', 'Свободные подключения', multiprocess_mode='livesum'
+)
+DB_POOL_OVERFLOW = Gauge(
+    'db_pool_overflow',
+    'Подключения сверх pool_size',
+    multiprocess_mode='livesum',
+)
+CACHE_HITS = Counter('cache_hits_total', 'Попадания в кэш', ['cache'])
+CACHE_MISSES = Counter('cache_misses_total', 'Промахи кэша', ['cache'])
+CACHE_COALESCED = Counter(
+    'cache_coalesced_total',
+    'Промахи, дождавшиеся загрузки другого запроса',
+    ['cache'],
+)
+CACHE_EVICTIONS = Counter(
+    'cache_evictions_total', 'Вытеснения из кэша при переполнении', ['cache']
+)
+
+HTTP_REQUESTS = Counter(
+    'http_requests_total',
+    'Запросы к API',
+    ['method', 'route', 'status'],
+)
+HTTP_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Время обработки запроса до последнего байта ответа',
+    ['method', 'route'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+HTTP_IN_FLIGHT = Gauge(
+    'http_requests_in_flight',
+    'Запросы в обработке',
+    ['method'],
+    multiprocess_mode='livesum',
+)
+HTTP_RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes',
+    'Размер тела ответа',
+    ['method', 'route'],
+    buckets=(100, 1000, 10_000, 100_000, 1_000_000, 10_000_000),
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    'db_queries_per_request',
+    'Запросы к базе за один запрос к API',
+    ['method', 'route'],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100),
+)
+DB_TIME_PER_REQUEST = Histogram(
+    'db_query_seconds_per_request',
+    'Суммарное время запросов к базе за один запрос к API',
+    ['method', 'route'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+# счётчики запросов к базе текущего запроса к API: [количество, секунды]
+request_queries: ContextVar[list | None] = ContextVar(
+    'request_queries', default=None
+)
+
+
+def record_query(seconds: float):
+    stats = request_queries.get()
+    if stats is not None:
+        stats[0] += 1
+        stats[1] += seconds
+
+
+class MetricsMiddleware:
+    """ASGI-middleware с метриками запросов по шаблону маршрута.
+
+    Маршрут известен только после обработки запроса роутером, поэтому
+    ``http_requests_in_flight`` разбит лишь по методу, а остальные метрики
+    - по шаблону пути вроде ``/api/v1/note/delete/{note_id}``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def route_path(scope) -> str:
+        route = scope.get('route')
+        if route is None:
+            # /docs и /openapi.json - маршруты Starlette без scope['route']
+            for candidate in scope['app'].routes:
+                if candidate.matches(scope)[0] == Match.FULL:
+                    route = candidate
+                    break
+        # путь без маршрута в метки не попадает: иначе метрик по числу URL
+        return route.path if route is not None else 'unmatched'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        status, size = 500, 0
+        stats = [0, 0.0]
+        token = request_queries.set(stats)
+        in_flight = HTTP_IN_FLIGHT.labels(method)
+        in_flight.inc()
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_flight.dec()
+            request_queries.reset(token)
+            path = self.route_path(scope)
+            HTTP_REQUESTS.labels(method, path, status).inc()
+            HTTP_LATENCY.labels(method, path).observe(elapsed)
+            HTTP_RESPONSE_SIZE.labels(method, path).observe(size)
+            DB_QUERIES_PER_REQUEST.labels(method, path).observe(stats[0])
+            DB_TIME_PER_REQUEST.labels(method, path).observe(stats[1])
+
+
+def observe_pool(pool, returning: int = 0):
+    """Обновляет метрики пула при выдаче и возврате подключений.
+
+    Событие checkin приходит до возврата подключения в пул, его передают
+    в ``returning``.
+    """
+    DB_POOL_SIZE.set(pool.size())
+    DB_POOL_CHECKED_OUT.set(pool.checkedout() - returning)
+    DB_POOL_CHECKED_IN.set(pool.checkedin() + returning)
+    # пока пул не заполнен, SQLAlchemy отдаёт отрицательное число
+    DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+
+def prepare_multiprocess_metrics(service: str, spawned: bool) -> bool:
+    """Готовит пустой каталог метрик сервиса перед запуском воркеров.
+
+    ``spawned`` - запросы обслуживают дочерние процессы uvicorn. Они
+    импортируют prometheus_client заново и наследуют
+    ``PROMETHEUS_MULTIPROC_DIR`` с подкаталогом сервиса, чтобы API и бот
+    не смешивали файлы. Этот процесс свои значения уже создал, поэтому
+    при одном процессе каталог не меняется и метрики отдаются напрямую.
+    Возвращает True, если метрики нужно суммировать по файлам воркеров.
+    """
+    if not spawned:
+        return False
+    base = os.getenv(MULTIPROC_DIR_ENV)
+    if not base:
+        LOGGER.warning(
+            f'{MULTIPROC_DIR_ENV} не задан, метрики воркеров не суммируются'
+        )
+        return False
+    path = os.path.join(base, service)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    os.environ[MULTIPROC_DIR_ENV] = path
+    return True
+
+
+def mark_worker_stopped():
+    if os.getenv(MULTIPROC_DIR_ENV):
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def start_metrics_server(port: int, aggregate: bool):
+    """Метрики на отдельном порту, не на публичном порту приложения.
+
+    Запускается до ``uvicorn.run`` в главном процессе. С ``aggregate``
+    отдаёт сумму по файлам всех воркеров, без него - метрики своего
+    процесса.
+    """
+    registry = REGISTRY
+    if aggregate:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    start_http_server(port, registry=registry)
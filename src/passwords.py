@@ -0,0 +1,45 @@
+"""Хеширование паролей bcrypt в отдельном пуле потоков.
+
+bcrypt отпускает GIL, поэтому потоки не блокируют цикл событий. Число
+одновременных вычислений и длина очереди к ним ограничены: если очередь
+заполнена, вызов сразу завершается ``PasswordHasherBusy``.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from config import settings
+
+pwd_context = CryptContext(
+    schemes=['bcrypt'],
+    deprecated='auto',
+    bcrypt__rounds=settings.bcrypt_rounds,
+)
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.password_hash_workers, thread_name_prefix='bcrypt'
+)
+_slots = asyncio.Semaphore(
+    settings.password_hash_workers + settings.password_hash_queue
+)
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+async def _run(func, *args):
+    if _slots.locked():
+        raise PasswordHasherBusy
+    async with _slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, func, *args)
+
+
+async def hash_password(password: str) -> str:
+    return await _run(pwd_context.hash, password)
+
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    return await _run(pwd_context.verify, password, password_hash)
@@ -0,0 +1,137 @@
+"""Операции с заметками, общие для маршрутов API и бота.
+
+Маршруты FastAPI и локальный транспорт бота вызывают одни и те же функции,
+поэтому проверки доступа и сброс кэшей у них одинаковые. Ошибки, как и в
+маршрутах, сообщаются через HTTPException.
+"""
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import LOGGER
+from src.api_v1.pagination import encode_cursor
+from src.api_v1.schemas import NewNoteSchema
+from src.auth import check_token
+from src.cache import notes_cache
+from src.database.models import NOTE_CURSOR_FIELDS, Note, Tag, User
+from src.passwords import PasswordHasherBusy
+
+
+def service_busy():
+    LOGGER.warning('Очередь хеширования паролей заполнена')
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail='Service is busy, try again later',
+        headers={'Retry-After': '1'},
+    )
+
+
+def user_id_from_payload(payload: dict) -> int:
+    user_id = payload['user_id']
+
+    if user_id and isinstance(user_id, int):
+        return user_id
+
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND, detail='User not found'
+    )
+
+
+def authorize(token: str | None) -> int:
+    """id пользователя по JWT, те же проверки, что у JWTBearer.
+
+    Токена нет у пользователя Telegram, вышедшего через /logout.
+    """
+    payload = check_token(token) if token else None
+    if not payload:
+        raise HTTPException(
+            status_code=403, detail='Invalid token or expired token.'
+        )
+    return user_id_from_payload(payload)
+
+
+async def issue_token(
+    username: str, password: str, session: AsyncSession
+) -> str:
+    try:
+        token = await User.new_jwt_token(username, password, session)
+    except PasswordHasherBusy:
+        raise service_busy()
+
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail='User not found'
+        )
+    await session.commit()
+    LOGGER.info(f'Вход в систему: {username}')
+
+    return token
+
+
+async def add_note(
+    user_id: int, note: NewNoteSchema, session: AsyncSession
+) -> Note:
+    tag_ids = await Tag.resolve_ids(note.tags, session)
+    new_note = await Note.create_note(
+        user_id, note.title, note.text, list(tag_ids.values()), session
+    )
+    await session.commit()
+    await notes_cache.invalidate(user_id)
+
+    LOGGER.info(f'Создана новая заметка: {new_note} пользователем {user_id}')
+    return new_note
+
+
+async def search_tag_ids(
+    tags: str, match_all: bool, session: AsyncSession
+) -> list[int] | None:
+    """id тегов для поиска или None, если под условие не попадёт ничего."""
+    titles = {title.strip() for title in tags.split(',') if title.strip()}
+    if not titles:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail='No tags given'
+        )
+
+    tag_ids = await Tag.get_ids_by_title(list(titles), session)
+    if not tag_ids or (match_all and len(tag_ids) < len(titles)):
+        return None
+    return sorted(tag_ids)
+
+
+def project(notes: list[dict], fields: tuple[str, ...]) -> list[dict]:
+    extra = set(NOTE_CURSOR_FIELDS).difference(fields)
+    for note in notes:
+        for name in extra:
+            del note[name]
+    return notes
+
+
+async def page_notes(
+    user_id: int,
+    limit: int,
+    position: tuple | None,
+    fields: tuple[str, ...],
+    session: AsyncSession,
+    **filters,
+) -> dict:
+    """Страница заметок и курсор следующей, как в ответе ``/notes``."""
+    notes = await Note.get_note_rows(
+        user_id, limit + 1, fields, position, session=session, **filters
+    )
+    next_cursor = None
+    if len(notes) > limit:
+        notes = notes[:limit]
+        next_cursor = encode_cursor(notes[-1]['created_at'], notes[-1]['id'])
+
+    return {'notes': project(notes, fields), 'next_cursor': next_cursor}
+
+
+async def iter_notes(
+    user_id: int,
+    fields: tuple[str, ...],
+    position: tuple | None = None,
+    **filters,
+):
+    """Все заметки пользователя словарями, списками по партиям выборки."""
+    chunks = Note.stream_note_rows(user_id, fields, position, **filters)
+    async for notes in chunks:
+        yield project(notes, fields)
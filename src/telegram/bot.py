@@ -1,28 +1,109 @@
 import asyncio
 
+import redis.asyncio as redis
+import uvicorn
 from aiogram import Bot, Dispatcher
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisStorage
 
 from config import LOGGER, settings
+from src.cache import telegram_user_cache
+from src.metrics import prepare_multiprocess_metrics, start_metrics_server
 from src.telegram.handlers.base import router as base_router
 from src.telegram.handlers.notes import router as notes_router
+from src.telegram.middlewares import TelegramUserMiddleware
+from src.telegram.sender import send_scheduler
+from src.tools import manager_api
 
 token = settings.bot_token
 
 
-async def main():
+def create_storage() -> BaseStorage:
+    """Хранилище состояний FSM: в памяти процесса или в Redis.
+
+    Состояния в Redis переживают перезапуск и общие для всех процессов
+    бота, что нужно для режима webhook с несколькими воркерами.
+    """
+    if settings.bot_fsm_storage == 'redis':
+        return RedisStorage.from_url(
+            settings.redis_url,
+            key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True),
+            state_ttl=settings.bot_fsm_ttl,
+            data_ttl=settings.bot_fsm_ttl,
+        )
+    return MemoryStorage()
+
+
+async def start_user_cache_sync():
+    """Сброс кэша пользователей Telegram во всех процессах webhook.
+
+    В режиме polling бот работает одним процессом и подписка не нужна.
+    """
+    await telegram_user_cache.start(redis.from_url(settings.redis_url))
+
+
+async def stop_user_cache_sync():
+    connection = telegram_user_cache.redis
+    await telegram_user_cache.stop()
+    await connection.aclose()
+
+
+def create_bot() -> Bot:
     bot = Bot(token)
+    bot.session.middleware(send_scheduler)
+
+    return bot
+
+
+def create_dispatcher() -> Dispatcher:
+    storage = create_storage()
 
-    dp = Dispatcher()
+    dp = Dispatcher(storage=storage)
+    dp.message.middleware(TelegramUserMiddleware())
+    dp.callback_query.middleware(TelegramUserMiddleware())
     dp.include_routers(base_router)
     dp.include_routers(notes_router)
+    dp.startup.register(manager_api.start)
+    dp.startup.register(send_scheduler.start)
+    dp.shutdown.register(manager_api.close)
+    dp.shutdown.register(send_scheduler.stop)
+    dp.shutdown.register(storage.close)
+    if settings.bot_mode == 'webhook':
+        dp.startup.register(start_user_cache_sync)
+        dp.shutdown.register(stop_user_cache_sync)
+
+    return dp
+
+
+async def main():
+    bot = create_bot()
+    dp = create_dispatcher()
 
-    await dp.start_polling(
-        bot,
-        skip_updates=True,
-    )
+    await bot.delete_webhook(drop_pending_updates=True)
+    await dp.start_polling(bot)
 
 
 if __name__ == '__main__':
-    LOGGER.info('Бот запущен')
-    asyncio.run(main())
+    LOGGER.info(f'Бот запущен в режиме {settings.bot_mode}')
+    aggregate = False
+    if settings.bot_mode == 'webhook':
+        aggregate = prepare_multiprocess_metrics(
+            'bot', settings.webhook_workers > 1
+        )
+    if settings.bot_metrics_port:
+        start_metrics_server(settings.bot_metrics_port, aggregate)
+    if settings.bot_mode == 'webhook':
+        uvicorn.run(
+            'src.telegram.webhook:create_webhook_app',
+            factory=True,
+            host=settings.webhook_host,
+            port=settings.webhook_port,
+            workers=settings.webhook_workers,
+            loop='uvloop',
+            http='httptools',
+            timeout_graceful_shutdown=settings.api_graceful_timeout,
+        )
+    else:
+        asyncio.run(main())
     LOGGER.info('Бот остановлен')
@@ -11,20 +11,21 @@ router = Router(name='base')
 
 
 @router.callback_query(StateFilter('*'), F.data == 'cancel')
-async def cancel_callback(callback: types.CallbackQuery, state: FSMContext):
+async def cancel_callback(
+    callback: types.CallbackQuery,
+    state: FSMContext,
+    user: TelegramUser | None,
+):
     """Сброс всех конечных автоматов/отмена всех состояний."""
     await state.clear()
-    tg_id = callback.from_user.id
-    user = await TelegramUser.check_user(tg_id)
 
     await callback.message.answer(f'МЕНЮ', reply_markup=await main_kb(user))
 
 
 @router.message(CommandStart())
-async def start_handler(message: types.Message):
+async def start_handler(message: types.Message, user: TelegramUser | None):
     """Получение стартового меню и клавиатуры."""
     tg_id = message.from_user.id
-    user = await TelegramUser.check_user(tg_id)
     LOGGER.info(f'Старт бота пользователем: {tg_id}')
 
     if not user:
@@ -1,16 +1,26 @@
+from contextlib import suppress
+
 from aiogram import F, Router, types
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.util import await_fallback
 
 from config import LOGGER
 from src.database.models import TelegramUser
 from src.telegram.keyboards.base import main_kb, to_main_menu
-from src.telegram.keyboards.notes import approve_or_cancel_kb
+from src.telegram.keyboards.notes import approve_or_cancel_kb, notes_page_kb
+from src.telegram.pages import (
+    NotesPageCallback,
+    NotesUnavailable,
+    drop_view,
+    load_page,
+    open_view,
+)
 from src.telegram.states import AuthDataState, NewNoteState, SearchNoteState
-from src.tools import ManagerAPI, validate_auth_parameters
+from src.tools import manager_api, validate_auth_parameters
 
 router = Router(name='notes')
-manager_api = ManagerAPI()
+UNAVAILABLE_MSG = 'Не удалось получить заметки, попробуйте немного позже'
 
 
 @router.callback_query(F.data == 'auth')
@@ -44,10 +54,9 @@ async def request_to_api(message: types.Message, state: FSMContext):
 
 
 @router.callback_query(F.data == 'logout')
-async def logout(callback: types.CallbackQuery):
+async def logout(callback: types.CallbackQuery, user: TelegramUser | None):
     msg = 'Что-то пошло не так...'
     tg_id = callback.from_user.id
-    user = await TelegramUser.check_user(tg_id)
     check_delete = await TelegramUser.delete_token(tg_id)
 
     if check_delete:
@@ -56,28 +65,68 @@ async def logout(callback: types.CallbackQuery):
 
 
 @router.callback_query(F.data == 'my-notes')
-async def all_notes(callback: types.CallbackQuery):
+async def all_notes(
+    callback: types.CallbackQuery,
+    state: FSMContext,
+    user: TelegramUser | None,
+):
     msg = 'У вас нет заметок'
 
-    tg_id = callback.from_user.id
-    notes = await manager_api.fetch_all_notes_for_user(tg_id)
-    if notes:
-        note_msg = ''
-        for note in notes:
-            tags = [tag['title'] for tag in note['tags'] if tag]
-            note_msg += f'Название: <b>{note["title"]}</b>\n'
-            note_msg += f'теги: ❗️{tags} ❗️\n'
-            note_msg += f'<i>{note["created_at"]}</i>\n'
-            note_msg += f'{note["text"]}\n\n'
-
-        msg = note_msg
-
-    for x in range(0, len(msg), 4096):
-        await callback.message.answer(
-            msg[x : x + 4096],
+    await open_view(state)
+    try:
+        text, has_next = await load_page(user, state, 0)
+    except NotesUnavailable:
+        await callback.message.edit_text(
+            UNAVAILABLE_MSG, reply_markup=await to_main_menu()
+        )
+        return
+
+    if text is None:
+        await callback.message.edit_text(
+            msg, reply_markup=await to_main_menu()
+        )
+        return
+
+    await callback.message.edit_text(
+        text, parse_mode='HTML', reply_markup=await notes_page_kb(0, has_next)
+    )
+
+
+@router.callback_query(NotesPageCallback.filter())
+async def notes_page(
+    callback: types.CallbackQuery,
+    callback_data: NotesPageCallback,
+    state: FSMContext,
+    user: TelegramUser | None,
+):
+    try:
+        page = await load_page(user, state, callback_data.page)
+    except NotesUnavailable:
+        await callback.answer(UNAVAILABLE_MSG, show_alert=True)
+        return
+
+    if page is None:
+        await callback.answer(
+            'Список устарел, откройте его заново', show_alert=True
+        )
+        return
+
+    text, has_next = page
+    if text is None:
+        # заметки удалены после открытия списка
+        await callback.answer(
+            'На этой странице больше нет заметок', show_alert=True
+        )
+        return
+
+    with suppress(TelegramBadRequest):
+        # повторное нажатие на ту же кнопку: сообщение не изменилось
+        await callback.message.edit_text(
+            text,
             parse_mode='HTML',
-            reply_markup=await to_main_menu(),
+            reply_markup=await notes_page_kb(callback_data.page, has_next),
         )
+    await callback.answer()
 
 
 @router.callback_query(F.data == 'new-note')
@@ -120,7 +169,7 @@ async def tags_for_note(message: types.Message, state: FSMContext):
     text = message.text
 
     try:
-        tags = text.split(',')
+        tags = [tag.strip() for tag in text.split(',') if tag.strip()]
         data.update({'tags': tags})
         await state.set_data(data)
     except ValueError:
@@ -134,18 +183,21 @@ async def tags_for_note(message: types.Message, state: FSMContext):
 
 
 @router.callback_query(F.data == 'approve')
-async def add_note(callback: types.CallbackQuery, state: FSMContext):
-    tg_id = callback.from_user.id
-    user = await TelegramUser.check_user(tg_id)
+async def add_note(
+    callback: types.CallbackQuery,
+    state: FSMContext,
+    user: TelegramUser | None,
+):
     msg = 'Что-то пошло не так...'
     data = await state.get_data()
 
     title = data['title']
     text = data['text']
     tags = data['tags']
-    res = await manager_api.create_note(tg_id, title, text, tags)
+    res = await manager_api.create_note(user, title, text, tags)
 
     if res.get('status'):
+        await drop_view(state)
         msg = 'Заметка добавлена'
 
     await callback.message.answer(msg, reply_markup=await main_kb(user))
@@ -164,39 +216,32 @@ async def search_note_start_state(
 
 
 @router.message(SearchNoteState.tags)
-async def tags_for_search(message: types.Message):
-    msg = 'Что-то пошло не так...'
-    try:
-        search_tags = message.text.split(',')
-    except ValueError:
-        LOGGER.exception(f'Неверный формат ввода {message.text}')
+async def tags_for_search(
+    message: types.Message, state: FSMContext, user: TelegramUser | None
+):
+    msg = 'Заметки с такими тегами не найдены'
+    search_tags = [tag.strip() for tag in (message.text or '').split(',')]
+    search_tags = [tag for tag in search_tags if tag]
+    if not search_tags:
+        LOGGER.info(f'Неверный формат ввода {message.text}')
         await message.answer(
             'Неверный формат ввода!',
             reply_markup=await approve_or_cancel_kb(True),
         )
         return
-    tg_id = message.from_user.id
-    notes = await manager_api.fetch_all_notes_for_user(tg_id)
-
-    if notes:
-        note_msg = ''
-        for note in notes:
-            tags = [tag['title'] for tag in note['tags'] if tag]
-            intersection = set(search_tags) & set(tags)
-
-            if not intersection:
-                continue
-
-            note_msg += f'Название: <b>{note["title"]}</b>\n'
-            note_msg += f'теги: ❗️{tags} ❗️\n'
-            note_msg += f'<i>{note["created_at"]}</i>\n'
-            note_msg += f'{note["text"]}\n\n'
-
-        msg = note_msg
-
-    for x in range(0, len(msg), 4096):
+    await open_view(state, search_tags)
+    try:
+        text, has_next = await load_page(user, state, 0)
+    except NotesUnavailable:
         await message.answer(
-            msg[x : x + 4096],
-            parse_mode='HTML',
-            reply_markup=await to_main_menu(),
+            UNAVAILABLE_MSG, reply_markup=await to_main_menu()
         )
+        return
+
+    if text is None:
+        await message.answer(msg, reply_markup=await to_main_menu())
+        return
+
+    await message.answer(
+        text, parse_mode='HTML', reply_markup=await notes_page_kb(0, has_next)
+    )
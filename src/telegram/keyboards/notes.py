@@ -1,6 +1,8 @@
 from aiogram.types import InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from src.telegram.pages import NotesPageCallback
+
 
 async def approve_or_cancel_kb(only_cansel: bool = False):
     keyboard = InlineKeyboardBuilder()
@@ -14,3 +16,28 @@ async def approve_or_cancel_kb(only_cansel: bool = False):
         keyboard.row(approve_bt, cancel_kb)
 
     return keyboard.as_markup()
+
+
+async def notes_page_kb(page: int, has_next: bool):
+    keyboard = InlineKeyboardBuilder()
+
+    buttons = []
+    if page > 0:
+        buttons.append(
+            InlineKeyboardButton(
+                text='◀️',
+                callback_data=NotesPageCallback(page=page - 1).pack(),
+            )
+        )
+    if has_next:
+        buttons.append(
+            InlineKeyboardButton(
+                text='▶️',
+                callback_data=NotesPageCallback(page=page + 1).pack(),
+            )
+        )
+    if buttons:
+        keyboard.row(*buttons)
+    keyboard.row(InlineKeyboardButton(text='меню', callback_data='cancel'))
+
+    return keyboard.as_markup()
@@ -0,0 +1,22 @@
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+
+from src.database.models import TelegramUser
+
+
+class TelegramUserMiddleware(BaseMiddleware):
+    """Загружает TelegramUser один раз на апдейт в ``data['user']``."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        from_user: User | None = data.get('event_from_user')
+        data['user'] = (
+            await TelegramUser.check_user(from_user.id) if from_user else None
+        )
+        return await handler(event, data)
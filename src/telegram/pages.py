@@ -0,0 +1,115 @@
+"""Постраничный просмотр заметок в боте.
+
+Страницы запрашиваются у API по курсору. Открытый список - теги поиска и
+курсоры пройденных страниц - хранится в хранилище FSM рядом с состоянием
+диалога, поэтому листать можно на любом воркере webhook. Отрисованные
+страницы кэшируются в ``notes_page_cache`` процесса по id списка.
+"""
+import html
+import uuid
+from dataclasses import replace
+from datetime import datetime
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.fsm.context import FSMContext
+
+from src.cache import notes_page_cache
+from src.database.models import TelegramUser
+from src.tools import manager_api
+
+MESSAGE_LIMIT = 4096
+
+
+class NotesPageCallback(CallbackData, prefix='notes'):
+    page: int
+
+
+class NotesUnavailable(Exception):
+    """API не отдал страницу: токен недействителен, лимит запросов и т.п."""
+
+
+def _shorten(raw: str, limit: int) -> str:
+    """Экранированный текст не длиннее ``limit``, обрезанный по символам."""
+    escaped = html.escape(raw)
+    if len(escaped) <= limit:
+        return escaped
+
+    # место под многоточие; сущность вроде &quot; длиннее символа до 6 раз
+    raw = raw[: max(limit - 1, 0)]
+    while raw and len(escaped := html.escape(raw)) > limit - 1:
+        raw = raw[: -max((len(escaped) - limit + 1) // 6, 1)]
+    return html.escape(raw) + '…'
+
+
+def render_note(note: dict, budget: int) -> str:
+    created_at = datetime.fromisoformat(note['created_at'])
+    tags = ', '.join(tag['title'] for tag in note['tags'] if tag)
+    head_limit = min(256, budget // 4)
+    head = (
+        f'<b>{_shorten(note["title"], head_limit)}</b>\n'
+        f'теги: {_shorten(tags, head_limit) or "—"}\n'
+        f'<i>{created_at:%d.%m.%Y %H:%M}</i>\n'
+    )
+    return head + _shorten(note['text'], budget - len(head))
+
+
+def render_page(notes: list[dict], page: int) -> str | None:
+    if not notes:
+        return None
+
+    header = f'Страница {page + 1}\n\n'
+    separator = '\n\n'
+    budget = (MESSAGE_LIMIT - len(header)) // len(notes) - len(separator)
+    return header + separator.join(render_note(n, budget) for n in notes)
+
+
+def view_context(state: FSMContext) -> FSMContext:
+    """Отдельная запись хранилища: данные диалогов список не затирают."""
+    return FSMContext(state.storage, replace(state.key, destiny='notes_view'))
+
+
+async def open_view(state: FSMContext, tags: list[str] | None = None):
+    """Открывает список: все заметки или поиск по тегам."""
+    await view_context(state).set_data(
+        {'id': uuid.uuid4().hex, 'tags': tags, 'cursors': [None]}
+    )
+
+
+async def drop_view(state: FSMContext):
+    await view_context(state).set_data({})
+
+
+async def load_page(
+    user: TelegramUser, state: FSMContext, page: int
+) -> tuple[str | None, bool] | None:
+    """Текст страницы и есть ли следующая.
+
+    None, если список не открыт или истёк срок его хранения, текст None -
+    заметок на странице нет. Кэшируются только непустые страницы, ошибка
+    API - ``NotesUnavailable``.
+    """
+    context = view_context(state)
+    view = await context.get_data()
+    if not view or page < 0 or page >= len(view['cursors']):
+        return None
+
+    key = (view['id'], page)
+    cached = notes_page_cache.get(key)
+    if cached is not None:
+        return cached
+
+    data = await manager_api.notes_page(
+        user, view['cursors'][page], view['tags']
+    )
+    if 'detail' in data:
+        raise NotesUnavailable(data['detail'])
+
+    next_cursor = data.get('next_cursor')
+    # повторный тап мог уже добавить курсор следующей страницы
+    if next_cursor and page == len(view['cursors']) - 1:
+        view['cursors'].append(next_cursor)
+        await context.set_data(view)
+    result = (render_page(data['notes'], page), bool(next_cursor))
+    if result[0] is not None:
+        notes_page_cache.set(key, result)
+    return result
@@ -0,0 +1,183 @@
+"""Планировщик исходящих запросов бота к Telegram.
+
+Подключается middleware к сессии ``Bot``, поэтому через него идут все
+``answer``/``edit_text`` обработчиков. Запросы в чат ждут токен корзины
+этого чата, затем попадают в общую очередь, которую разбирает один цикл
+с общим ограничением скорости. Общий лимит Telegram делится между
+воркерами webhook. На RetryAfter чат ставится на паузу, а запрос
+повторяется; если за время паузы RetryAfter пришёл и для другого чата,
+ограничение общее и на паузу ставится вся отправка.
+"""
+import asyncio
+import itertools
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from prometheus_client import Counter, Gauge, Histogram
+
+from config import LOGGER, settings
+from src.cache import TTLCache
+
+SEND_QUEUE_DEPTH = Gauge(
+    'telegram_send_queue_depth',
+    'Запросы в очереди на отправку',
+    multiprocess_mode='livesum',
+)
+SEND_LATENCY = Histogram(
+    'telegram_send_seconds',
+    'Время от постановки запроса в очередь до ответа Telegram',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+SEND_RETRIES = Counter(
+    'telegram_send_retries_total', 'Повторы запросов после RetryAfter'
+)
+SEND_GLOBAL_PAUSES = Counter(
+    'telegram_send_global_pauses_total',
+    'Паузы всей отправки после RetryAfter в нескольких чатах',
+)
+
+
+def global_rate() -> float:
+    """Доля общего лимита на процесс: воркеры webhook делят его поровну."""
+    workers = settings.webhook_workers if settings.bot_mode == 'webhook' else 1
+    return settings.bot_global_rate / max(workers, 1)
+
+
+class TokenBucket:
+    """Корзина токенов: ``rate`` запросов в секунду, запас ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(
+            self._paused_until, time.monotonic() + seconds
+        )
+        self._tokens = 0
+
+    async def acquire(self):
+        # под блокировкой ожидающие получают токены по очереди
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated) * self.rate,
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SendScheduler(BaseRequestMiddleware):
+    def __init__(self):
+        rate = global_rate()
+        self._global = TokenBucket(rate, max(rate, 1))
+        self._chats = TTLCache('telegram_chats', 100000, ttl=60)
+        # чаты на паузе после RetryAfter: id чата -> время окончания паузы
+        self._limited: dict = {}
+        self._queue: asyncio.Queue | None = None
+        self._worker: asyncio.Task | None = None
+        self._sending: set[asyncio.Task] = set()
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+        while self._queue and not self._queue.empty():
+            done, *_ = self._queue.get_nowait()
+            SEND_QUEUE_DEPTH.dec()
+            done.cancel()
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # в группах Telegram допускает 20 сообщений в минуту
+            group = isinstance(chat_id, str) or chat_id < 0
+            rate = settings.bot_group_rate if group else settings.bot_chat_rate
+            bucket = TokenBucket(rate, max(rate, 1))
+        # запись продлевается при каждом запросе, простаивающие вытесняются
+        self._chats.set(chat_id, bucket)
+        return bucket
+
+    def _rate_limited(self, chat_id, seconds: float):
+        self._chat_bucket(chat_id).pause(seconds)
+        now = time.monotonic()
+        self._limited = {
+            chat: until for chat, until in self._limited.items() if until > now
+        }
+        self._limited[chat_id] = now + seconds
+        # лимит одного чата соблюдает его корзина, RetryAfter сразу в
+        # нескольких чатах - признак общего ограничения бота
+        if len(self._limited) > 1:
+            SEND_GLOBAL_PAUSES.inc()
+            self._global.pause(seconds)
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None or self._worker is None:
+            return await make_request(bot, method)
+
+        started = time.monotonic()
+        try:
+            for attempt in itertools.count():
+                await self._chat_bucket(chat_id).acquire()
+                done = asyncio.get_running_loop().create_future()
+                self._queue.put_nowait((done, make_request, bot, method))
+                SEND_QUEUE_DEPTH.inc()
+                try:
+                    return await done
+                except TelegramRetryAfter as e:
+                    if attempt >= settings.bot_send_retries:
+                        raise
+                    LOGGER.warning(
+                        f'Telegram просит подождать {e.retry_after} с '
+                        f'перед отправкой в чат {chat_id}'
+                    )
+                    SEND_RETRIES.inc()
+                    self._rate_limited(chat_id, e.retry_after)
+        finally:
+            SEND_LATENCY.observe(time.monotonic() - started)
+
+    async def _run(self):
+        while True:
+            done, make_request, bot, method = await self._queue.get()
+            SEND_QUEUE_DEPTH.dec()
+            if done.done():
+                continue
+            await self._global.acquire()
+            task = asyncio.create_task(
+                self._send(done, make_request, bot, method)
+            )
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    @staticmethod
+    async def _send(done, make_request, bot, method):
+        try:
+            result = await make_request(bot, method)
+        except Exception as e:
+            if not done.done():
+                done.set_exception(e)
+        else:
+            if not done.done():
+                done.set_result(result)
+
+
+send_scheduler = SendScheduler()
@@ -0,0 +1,68 @@
+"""ASGI-приложение бота в режиме webhook.
+
+Telegram присылает апдейты POST-запросами, поэтому бот масштабируется
+как обычный веб-сервис: несколько воркеров uvicorn или реплик за
+балансировщиком. Состояния FSM при этом должны храниться в Redis
+(``BOT_FSM_STORAGE=redis``).
+"""
+import secrets
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException, Request, Response, status
+
+from config import LOGGER, settings
+from src.metrics import mark_worker_stopped
+from src.telegram.bot import create_bot, create_dispatcher
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not settings.webhook_url or not settings.webhook_secret:
+        raise RuntimeError('Не заданы WEBHOOK_URL и WEBHOOK_SECRET')
+    if settings.bot_fsm_storage != 'redis' and settings.webhook_workers > 1:
+        LOGGER.warning(
+            'Состояния FSM в памяти не видны другим воркерам, '
+            'задайте BOT_FSM_STORAGE=redis'
+        )
+
+    bot = create_bot()
+    dp = create_dispatcher()
+    app.state.bot, app.state.dp = bot, dp
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+
+    # воркеры стартуют одновременно, webhook меняется только при отличии
+    url = settings.webhook_url.rstrip('/') + settings.webhook_path
+    info = await bot.get_webhook_info()
+    if info.url != url:
+        await bot.set_webhook(
+            url,
+            secret_token=settings.webhook_secret,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        LOGGER.info(f'Установлен webhook {url}')
+
+    yield
+    await dp.emit_shutdown(bot=bot, dispatcher=dp)
+    await bot.session.close()
+    mark_worker_stopped()
+
+
+async def handle_update(request: Request):
+    secret = request.headers.get(SECRET_HEADER, '')
+    if not secrets.compare_digest(
+        secret.encode(), settings.webhook_secret.encode()
+    ):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+    state = request.app.state
+    await state.dp.feed_webhook_update(state.bot, await request.json())
+    return Response()
+
+
+def create_webhook_app():
+    app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None)
+    app.add_api_route(settings.webhook_path, handle_update, methods=['POST'])
+
+    return app
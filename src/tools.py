@@ -1,28 +1,6 @@
-import time
-
-import aiohttp
-import jwt
-from jwt.exceptions import (
-    DecodeError,
-    ExpiredSignatureError,
-    InvalidSignatureError,
-)
-
 from config import LOGGER, settings
 from src.database.models import TelegramUser
-
-
-def check_token(token: str):
-    try:
-        decoded_token = jwt.decode(
-            token, settings.secret_key, algorithms=[settings.algorithm_hash]
-        )
-        return (
-            decoded_token if decoded_token['expires'] >= time.time() else None
-        )
-    except (ExpiredSignatureError, InvalidSignatureError, DecodeError) as e:
-        LOGGER.exception(f'Токен {token} \n {e}')
-        return {}
+from src.transports import TRANSPORTS
 
 
 async def validate_auth_parameters(parameters: str):
@@ -35,36 +13,38 @@ async def validate_auth_parameters(parameters: str):
 
 
 class ManagerAPI:
-    @classmethod
-    async def auth(cls, username: str, password: str):
-        data = {'username': username, 'password': password}
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                'http://localhost:8000/api/v1/refresh-jwt', json=data
-            ) as resp:
-                return await resp.json()
+    """Клиент сервиса заметок для бота.
+
+    Передаёт запрос с JWT пользователя Telegram транспорту:
+    ``HTTPTransport`` или ``LocalTransport`` (``BOT_TRANSPORT``).
+    """
 
-    @classmethod
-    async def fetch_all_notes_for_user(cls, telegram_id: int):
-        user = await TelegramUser.check_user(telegram_id)
-        headers = {'Authorization': f'Bearer {user.token}'}
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                'http://localhost:8000/api/v1/notes', headers=headers
-            ) as resp:
-                return await resp.json()
+    def __init__(self, transport):
+        self.transport = transport
+
+    async def start(self):
+        await self.transport.start()
+
+    async def close(self):
+        await self.transport.close()
+
+    async def auth(self, username: str, password: str):
+        return await self.transport.auth(username, password)
+
+    async def notes_page(
+        self,
+        user: TelegramUser,
+        cursor: str | None = None,
+        tags: list[str] | None = None,
+    ):
+        return await self.transport.notes_page(
+            user.token, settings.bot_notes_page_size, cursor, tags
+        )
 
-    @classmethod
     async def create_note(
-        cls, telegram_id: int, title: str, text: str, tags: list
+        self, user: TelegramUser, title: str, text: str, tags: list
     ):
-        user = await TelegramUser.check_user(telegram_id)
-        headers = {'Authorization': f'Bearer {user.token}'}
-        data = {'title': title, 'text': text, 'tags': tags}
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                'http://localhost:8000/api/v1/note/create',
-                headers=headers,
-                json=data,
-            ) as resp:
-                return await resp.json()
+        return await self.transport.create_note(user.token, title, text, tags)
+
+
+manager_api = ManagerAPI(TRANSPORTS[settings.bot_transport]())
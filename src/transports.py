@@ -0,0 +1,234 @@
+"""Транспорты, через которые бот обращается к сервису заметок.
+
+``HTTPTransport`` ходит в API по сети, ``LocalTransport`` вызывает функции
+из ``src.services`` в том же процессе: без HTTP, JSON и лимитов запросов,
+но с той же проверкой JWT. Оба возвращают то же, что вернул бы API.
+"""
+import asyncio
+import json
+import random
+
+import aiohttp
+import redis.asyncio as redis
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from config import LOGGER, settings
+from src import services
+from src.api_v1.pagination import decode_cursor
+from src.api_v1.schemas import NewNoteSchema
+from src.cache import notes_cache, tag_cache
+from src.database.base import session_scope
+from src.database.models import Tag
+
+BOT_NOTE_FIELDS = ('title', 'text', 'tags', 'created_at')
+
+
+class HTTPTransport:
+    """Запросы к API заметок по HTTP.
+
+    Одна ClientSession с пулом keep-alive подключений на всё время работы
+    бота: открывается в ``start`` и закрывается в ``close``.
+    """
+
+    retry_statuses = {502, 503, 504}
+
+    def __init__(self):
+        self._session: aiohttp.ClientSession | None = None
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(
+            limit=settings.api_connection_limit,
+            ttl_dns_cache=300,
+            keepalive_timeout=settings.api_keepalive_timeout,
+        )
+        self._session = aiohttp.ClientSession(
+            base_url=settings.api_base_url,
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(
+                total=settings.api_timeout,
+                connect=settings.api_connect_timeout,
+            ),
+        )
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def _request(
+        self, method: str, path: str, idempotent: bool = True, **kwargs
+    ) -> tuple[int, bytes]:
+        """Запрос с повторами при сбоях сети и ответах 502-504.
+
+        Паузы между попытками растут экспоненциально со случайным
+        разбросом. Неидемпотентный запрос повторяется, только если он не
+        дошёл до обработчика: подключиться не удалось или ответ 503.
+        """
+        for attempt in range(settings.api_retries + 1):
+            last_attempt = attempt == settings.api_retries
+            retry_after = 0
+            try:
+                async with self._session.request(
+                    method, path, **kwargs
+                ) as resp:
+                    body = await resp.read()
+                    retry = resp.status in self.retry_statuses and (
+                        idempotent or resp.status == 503
+                    )
+                    if not retry or last_attempt:
+                        return resp.status, body
+                    retry_after = resp.headers.get('Retry-After', '0')
+                    retry_after = (
+                        int(retry_after) if retry_after.isdigit() else 0
+                    )
+                    reason = f'HTTP {resp.status}'
+            except aiohttp.ClientConnectorError as e:
+                if last_attempt:
+                    raise
+                reason = str(e)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if not idempotent or last_attempt:
+                    raise
+                reason = repr(e)
+
+            delay = random.uniform(
+                0, settings.api_retry_backoff * 2**attempt
+            )
+            LOGGER.warning(
+                f'{method} {path}: {reason}, повтор {attempt + 1} '
+                f'из {settings.api_retries}'
+            )
+            await asyncio.sleep(max(delay, retry_after))
+
+    async def auth(self, username: str, password: str) -> dict:
+        data = {'username': username, 'password': password}
+        _, body = await self._request('POST', '/api/v1/refresh-jwt', json=data)
+        return json.loads(body)
+
+    async def notes_page(
+        self,
+        token: str,
+        limit: int,
+        cursor: str | None = None,
+        tags: list[str] | None = None,
+    ) -> dict:
+        path = '/api/v1/notes'
+        params = {'limit': limit, 'fields': ','.join(BOT_NOTE_FIELDS)}
+        if cursor:
+            params['cursor'] = cursor
+        if tags is not None:
+            path = '/api/v1/notes/search'
+            params.update(tags=','.join(tags), mode='any')
+
+        status, body = await self._request(
+            'GET',
+            path,
+            headers={'Authorization': f'Bearer {token}'},
+            params=params,
+        )
+        if status != 200:
+            LOGGER.warning(f'Заметки не получены: HTTP {status}')
+            try:
+                return {'detail': json.loads(body)['detail']}
+            except (ValueError, KeyError, TypeError):
+                return {'detail': f'HTTP {status}'}
+        return json.loads(body)
+
+    async def create_note(
+        self, token: str, title: str, text: str, tags: list
+    ) -> dict:
+        data = {'title': title, 'text': text, 'tags': tags}
+        _, body = await self._request(
+            'POST',
+            '/api/v1/note/create',
+            idempotent=False,
+            headers={'Authorization': f'Bearer {token}'},
+            json=data,
+        )
+        return json.loads(body)
+
+
+class LocalTransport:
+    """Вызовы сервисного слоя в процессе бота.
+
+    Для сброса кэшей API процесс подключается к тому же Redis: запись из
+    бота увеличивает версию кэша заметок.
+    """
+
+    def __init__(self):
+        self._redis = None
+
+    async def start(self):
+        self._redis = redis.from_url(settings.redis_url, encoding='utf8')
+        notes_cache.init(self._redis)
+        tag_cache.update(await Tag.get_title_ids(settings.tag_cache_size))
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+    async def auth(self, username: str, password: str) -> dict:
+        try:
+            async with session_scope() as session:
+                token = await services.issue_token(username, password, session)
+        except HTTPException as e:
+            return {'detail': e.detail}
+
+        return {'token': f'Bearer {token}'}
+
+    async def notes_page(
+        self,
+        token: str,
+        limit: int,
+        cursor: str | None = None,
+        tags: list[str] | None = None,
+    ) -> dict:
+        filters = {}
+        try:
+            user_id = services.authorize(token)
+            position = decode_cursor(cursor) if cursor else None
+            async with session_scope() as session:
+                if tags is not None:
+                    tag_ids = await services.search_tag_ids(
+                        ','.join(tags), False, session
+                    )
+                    if tag_ids is None:
+                        return {'notes': [], 'next_cursor': None}
+                    filters = {'tag_ids': tag_ids, 'match_all': False}
+
+                page = await services.page_notes(
+                    user_id,
+                    limit,
+                    position,
+                    BOT_NOTE_FIELDS,
+                    session,
+                    **filters,
+                )
+        except HTTPException as e:
+            LOGGER.warning(f'Заметки не получены: {e.detail}')
+            return {'detail': e.detail}
+
+        for note in page['notes']:
+            # как в ответе API, где дата сериализуется в ISO 8601
+            note['created_at'] = note['created_at'].isoformat()
+        return page
+
+    async def create_note(
+        self, token: str, title: str, text: str, tags: list
+    ) -> dict:
+        try:
+            user_id = services.authorize(token)
+            note = NewNoteSchema(title=title, text=text, tags=tags)
+            async with session_scope() as session:
+                await services.add_note(user_id, note, session)
+        except HTTPException as e:
+            return {'detail': e.detail}
+        except ValidationError as e:
+            return {'detail': e.errors(include_url=False)}
+
+        return {'status': True}
+
+
+TRANSPORTS = {'http': HTTPTransport, 'local': LocalTransport}
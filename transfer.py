@@ -0,0 +1,75 @@
+"""Выгрузка и загрузка заметок пользователя из командной строки.
+
+python transfer.py export --username user -o notes.ndjson.gz --gzip
+python transfer.py import --username user -i notes.csv --format csv
+"""
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import select
+
+from config import LOGGER
+from src.database.base import session_scope
+from src.database.models import User
+from src.database.transfer import FORMATS, export_notes, import_notes
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+async def get_user_id(username: str) -> int:
+    async with session_scope() as session:
+        user_id = await session.scalar(
+            select(User.id).where(User.username == username)
+        )
+    if user_id is None:
+        sys.exit(f'Пользователь {username} не найден')
+    return user_id
+
+
+async def read_chunks(file):
+    while chunk := await asyncio.to_thread(file.read, READ_CHUNK_SIZE):
+        yield chunk
+
+
+async def main(args):
+    user_id = await get_user_id(args.username)
+
+    if args.command == 'export':
+        file = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            async for chunk in export_notes(user_id, args.format, args.gzip):
+                file.write(chunk)
+        finally:
+            if args.output:
+                file.close()
+        LOGGER.info(f'Заметки пользователя {args.username} выгружены')
+        return
+
+    file = open(args.input, 'rb') if args.input else sys.stdin.buffer
+    try:
+        imported = await import_notes(
+            user_id, read_chunks(file), args.format, args.gzip
+        )
+    finally:
+        if args.input:
+            file.close()
+    LOGGER.info(f'Импортировано {imported} заметок для {args.username}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export')
+    export.add_argument('-o', '--output', help='по умолчанию stdout')
+
+    load = commands.add_parser('import')
+    load.add_argument('-i', '--input', help='по умолчанию stdin')
+
+    for command in (export, load):
+        command.add_argument('--username', required=True)
+        command.add_argument('--format', choices=FORMATS, default='ndjson')
+        command.add_argument('--gzip', action='store_true')
+
+    asyncio.run(main(parser.parse_args()))